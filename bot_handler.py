@@ -5,77 +5,26 @@ Handles all Telegram bot interactions and commands
 
 import asyncio
 import logging
-from datetime import datetime, date
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
 from typing import List, Dict, Optional
-import json
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
-    ContextTypes, filters
+    ContextTypes, Defaults, filters
 )
 
+from config import Config
 from data_processor import DataProcessor
-from utils import format_stock_data, format_error_message
+from utils import ErrorKind, format_stock_data, format_error_message, format_stock_page
 
 logger = logging.getLogger(__name__)
 
-class TelegramBotHandler:
-    """Handles Telegram bot interactions"""
-    
-    def __init__(self, bot_token: str):
-        self.bot_token = bot_token
-        self.application = None
-        self.data_processor = DataProcessor()
-        
-    def start(self):
-        """Start the Telegram bot using run_polling"""
-        try:
-            # Create application
-            self.application = Application.builder().token(self.bot_token).build()
-            
-            # Add handlers
-            self._add_handlers()
-            
-            logger.info("🤖 Starting Telegram bot with polling...")
-            
-            # Start the bot with run_polling (this is blocking and handles event loop)
-            self.application.run_polling()
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to start Telegram bot: {e}")
-            raise
-    
-    async def stop(self):
-        """Stop the Telegram bot"""
-        if self.application:
-            # run_polling handles shutdown automatically
-            logger.info("🤖 Telegram bot stopped")
-    
-    def _add_handlers(self):
-        """Add command and message handlers"""
-        # Command handlers
-        self.application.add_handler(CommandHandler("start", self.start_command))
-        self.application.add_handler(CommandHandler("help", self.help_command))
-        self.application.add_handler(CommandHandler("status", self.status_command))
-        self.application.add_handler(CommandHandler("query", self.query_command))
-        self.application.add_handler(CommandHandler("list", self.list_stocks_command))
-        self.application.add_handler(CommandHandler("history", self.history_command))
-        
-        # Message handlers
-        self.application.add_handler(MessageHandler(
-            filters.TEXT & ~filters.COMMAND, self.handle_stock_query
-        ))
-        
-        # Callback query handler for inline keyboards
-        self.application.add_handler(CallbackQueryHandler(self.button_callback))
-        
-        # Error handler
-        self.application.add_error_handler(self.error_handler)
-    
-    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /start command"""
-        welcome_message = """
+_WELCOME_MESSAGE = """
 🚀 **Welcome to NSE Oi Spurts Monitor Bot!**
 
 I help you track Options Interest (OI) spurts data from NSE India.
@@ -99,29 +48,9 @@ I help you track Options Interest (OI) spurts data from NSE India.
 • `/history INFY`
 
 Type /help for more detailed information!
-        """
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("📊 Check Status", callback_data="status"),
-                InlineKeyboardButton("📋 List Stocks", callback_data="list")
-            ],
-            [
-                InlineKeyboardButton("❓ Help", callback_data="help"),
-                InlineKeyboardButton("📈 Sample Query", callback_data="sample")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            welcome_message,
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-    
-    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /help command"""
-        help_message = """
+"""
+
+_HELP_MESSAGE = """
 📖 **NSE Oi Spurts Bot - Help Guide**
 
 🤖 **Available Commands:**
@@ -153,17 +82,293 @@ The bot monitors NSE OI Spurts data every 20 minutes during market hours (10:00
 • Historical tracking
 • Smart stock search
 • Market hours monitoring
-        """
+"""
+
+_SAMPLE_MESSAGE = """
+📈 **Sample Stock Query**
+
+Try sending me any of these:
+• `RELIANCE`
+• `TCS`
+• `HDFC`
+• `INFY`
+• `/query WIPRO`
+• `/history SBIN`
+
+Just type the stock name or use the commands!
+""".strip()
+
+_START_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📊 Check Status", callback_data="status"),
+        InlineKeyboardButton("📋 List Stocks", callback_data="list")
+    ],
+    [
+        InlineKeyboardButton("❓ Help", callback_data="help"),
+        InlineKeyboardButton("📈 Sample Query", callback_data="sample")
+    ]
+])
+
+@lru_cache(maxsize=2048)
+def _normalize_query(text: str) -> str:
+    """Normalize user-typed stock names (repeated tickers hit the cache)"""
+    return text.upper().strip()
+
+def _format_history_time(timestamp: str) -> str:
+    """Format an ISO timestamp as HH:MM for history listings"""
+    if not timestamp:
+        return 'N/A'
+    # ISO timestamps are 'YYYY-MM-DDTHH:MM...', so HH:MM is a fixed slice
+    if len(timestamp) >= 16 and timestamp[10] in 'T ':
+        return timestamp[11:16]
+    return timestamp[:5]
+
+def _format_history_line(entry: Dict) -> str:
+    """Format a single history entry as a Markdown line"""
+    # Entries stored before time_str existed still need parsing
+    time_str = entry.get('time_str') or _format_history_time(entry.get('timestamp', ''))
+    change = entry.get('change', 0)
+    change_indicator = f" ⬆️(+{change})" if change > 0 else f" ⬇️({change})" if change < 0 else ""
+    return f"`{time_str}` - Serial: `{entry.get('serial_number', 'N/A')}`{change_indicator}"
+
+# Inline keyboard callback data -> handler method name
+_CALLBACK_DISPATCH = {
+    "status": "status_command",
+    "list": "list_stocks_command",
+    "help": "help_command",
+}
+
+# Cache lifetimes (seconds) for read-heavy command results
+LIST_CACHE_TTL = 60
+STATUS_CACHE_TTL = 5
+SEARCH_CACHE_TTL = 60
+
+# Stocks shown per /list page
+LIST_PAGE_SIZE = 20
+
+# Number of most recent entries shown by /history
+HISTORY_DISPLAY_LIMIT = 10
+
+# Minimum delay between outbound messages (Telegram allows ~30 msg/s overall)
+SEND_INTERVAL = 1 / 30
+
+# Worker threads for blocking DataProcessor calls made from handlers
+HANDLER_THREAD_WORKERS = 5
+
+class _TTLCache:
+    """
+    Small async-safe cache of computed values with per-entry expiry
+    Entries are only touched on the event loop thread and never across an await,
+    so no lock is needed; concurrent misses for one key share a single computation
+    while other keys are computed in parallel
+    """
+    
+    def __init__(self, max_entries: int = 1024):
+        self._entries: Dict[str, tuple] = {}  # key -> (expiry, version, value)
+        self._pending: Dict[tuple, asyncio.Task] = {}  # (key, version) -> computation in flight
+        self.max_entries = max_entries
+    
+    async def get_or_compute(self, key: str, ttl: float, version: int, func, *args):
+        """Return the cached value for key, recomputing it if expired or stale"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and entry[0] > now and entry[1] == version:
+            return entry[2]
+        
+        pending_key = (key, version)
+        task = self._pending.get(pending_key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, now + ttl, version, func, args))
+            self._pending[pending_key] = task
+            task.add_done_callback(lambda _: self._pending.pop(pending_key, None))
         
-        await update.message.reply_text(
-            help_message,
-            parse_mode='Markdown'
+        # Shielded so one cancelled caller does not cancel the shared computation
+        return await asyncio.shield(task)
+    
+    async def _compute(self, key: str, expiry: float, version: int, func, args: tuple):
+        """Run func in a worker thread and store its result"""
+        value = await asyncio.to_thread(func, *args)
+        self._entries.pop(key, None)
+        self._entries[key] = (expiry, version, value)
+        
+        # Evict the oldest entries (insertion order) once over capacity
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+        return value
+    
+    def clear(self):
+        """Drop all cached values"""
+        self._entries.clear()
+
+class TelegramBotHandler:
+    """Handles Telegram bot interactions"""
+    
+    def __init__(self, bot_token: str, use_webhook: Optional[bool] = None):
+        self.bot_token = bot_token
+        # Default to webhooks whenever a public URL is configured
+        self.use_webhook = bool(Config.PUBLIC_URL) if use_webhook is None else use_webhook
+        self.application = None
+        self.data_processor = DataProcessor()
+        self._cache = _TTLCache()
+        self._outbox: asyncio.Queue = asyncio.Queue()  # (chat_id, text, kwargs)
+        self._sender_task: Optional[asyncio.Task] = None
+        
+    def start(self):
+        """Start the Telegram bot using run_webhook (or run_polling as fallback)"""
+        try:
+            if self.use_webhook and not Config.PUBLIC_URL:
+                raise ValueError("PUBLIC_URL must be set to receive Telegram webhooks")
+            
+            # Create application
+            self.application = (
+                Application.builder()
+                .token(self.bot_token)
+                .defaults(Defaults(parse_mode=ParseMode.MARKDOWN))
+                .concurrent_updates(True)
+                .post_init(self._post_init)
+                .post_stop(self._post_stop)
+                .build()
+            )
+            
+            # Add handlers
+            self._add_handlers()
+            
+            if self.use_webhook:
+                logger.info("🤖 Starting Telegram bot with webhook...")
+                
+                # Start the bot with run_webhook (this is blocking, registers the
+                # webhook with Telegram and handles the event loop)
+                self.application.run_webhook(
+                    listen=Config.WEBHOOK_LISTEN,
+                    port=Config.WEBHOOK_PORT,
+                    url_path=self.bot_token,
+                    webhook_url=f"{Config.PUBLIC_URL}/{self.bot_token}"
+                )
+            else:
+                logger.info("🤖 Starting Telegram bot with polling...")
+                
+                # Start the bot with run_polling (this is blocking and handles event loop)
+                self.application.run_polling()
+            
+        except Exception as e:
+            logger.error("❌ Failed to start Telegram bot: %s", e)
+            raise
+    
+    async def _post_init(self, application: Application):
+        """Size the handler thread pool and start the outbound sender"""
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=HANDLER_THREAD_WORKERS)
+        )
+        self._sender_task = asyncio.create_task(self._sender())
+    
+    async def _post_stop(self, application: Application):
+        """Flush pending replies and remove the webhook while the bot is still initialized"""
+        if self._sender_task:
+            try:
+                await asyncio.wait_for(self._outbox.join(), timeout=5)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️  Dropping %s unsent messages", self._outbox.qsize())
+            self._sender_task.cancel()
+            self._sender_task = None
+        
+        if self.use_webhook:
+            try:
+                await application.bot.delete_webhook()
+                logger.info("🔌 Telegram webhook removed")
+            except Exception as e:
+                logger.error("❌ Failed to delete webhook: %s", e)
+    
+    def _reply(self, update: Update, text: str, **kwargs):
+        """Queue a message to the update's chat; handlers return without waiting on Telegram"""
+        self._outbox.put_nowait((update.effective_chat.id, text, kwargs))
+    
+    async def _sender(self):
+        """Single consumer that sends queued messages, paced to Telegram's rate limit"""
+        while True:
+            chat_id, text, kwargs = await self._outbox.get()
+            try:
+                await self.application.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except Exception as e:
+                logger.error("❌ Failed to send message to chat %s: %s", chat_id, e)
+            finally:
+                self._outbox.task_done()
+            await asyncio.sleep(SEND_INTERVAL)
+    
+    async def stop(self):
+        """Stop the Telegram bot"""
+        if self.application:
+            # run_webhook/run_polling handle shutdown automatically
+            logger.info("🤖 Telegram bot stopped")
+    
+    async def _cached(self, key: str, ttl: float, func, *args):
+        """Serve func(*args) from the TTL cache, invalidated on data refresh"""
+        return await self._cache.get_or_compute(
+            key, ttl, self.data_processor.data_version, func, *args
+        )
+    
+    def _get_sorted_stocks(self) -> List[Dict]:
+        """Get today's stocks sorted by name, as shown by /list"""
+        stocks = self.data_processor.get_all_stocks_today()
+        return sorted(stocks, key=itemgetter('name'))  # Every entry carries its name
+    
+    async def _render_list_page(self, page_idx: int) -> Optional[tuple]:
+        """Format one /list page and its navigation keyboard (None when no data)"""
+        stocks = await self._cached("list", LIST_CACHE_TTL, self._get_sorted_stocks)
+        if not stocks:
+            return None
+        
+        total_pages = (len(stocks) + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
+        page_idx = min(max(page_idx, 0), total_pages - 1)
+        
+        buttons = []
+        if page_idx > 0:
+            buttons.append(InlineKeyboardButton("◀", callback_data=f"list:{page_idx - 1}"))
+        if page_idx < total_pages - 1:
+            buttons.append(InlineKeyboardButton("▶", callback_data=f"list:{page_idx + 1}"))
+        keyboard = InlineKeyboardMarkup([buttons]) if buttons else None
+        
+        return format_stock_page(stocks, page_idx, LIST_PAGE_SIZE), keyboard
+    
+    def _add_handlers(self):
+        """Add command and message handlers"""
+        # Command handlers
+        self.application.add_handler(CommandHandler("start", self.start_command))
+        self.application.add_handler(CommandHandler("help", self.help_command))
+        self.application.add_handler(CommandHandler("status", self.status_command))
+        self.application.add_handler(CommandHandler("query", self.query_command))
+        self.application.add_handler(CommandHandler("list", self.list_stocks_command))
+        self.application.add_handler(CommandHandler("history", self.history_command))
+        
+        # Message handlers
+        self.application.add_handler(MessageHandler(
+            filters.TEXT & ~filters.COMMAND, self.handle_stock_query
+        ))
+        
+        # Callback query handler for inline keyboards
+        self.application.add_handler(CallbackQueryHandler(self.button_callback))
+        
+        # Error handler
+        self.application.add_error_handler(self.error_handler)
+    
+    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /start command"""
+        self._reply(
+            update,
+            _WELCOME_MESSAGE,
+            reply_markup=_START_KEYBOARD
+        )
+    
+    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /help command"""
+        self._reply(
+            update,
+            _HELP_MESSAGE
         )
     
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /status command"""
         try:
-            status = self.data_processor.get_bot_status()
+            status = await self._cached("status", STATUS_CACHE_TTL, self.data_processor.get_bot_status)
             
             status_message = f"""
 📊 **NSE Oi Spurts Bot Status**
@@ -180,145 +385,123 @@ The bot monitors NSE OI Spurts data every 20 minutes during market hours (10:00
 📅 **Date:** {status.get('current_date', 'Unknown')}
             """.strip()
             
-            await update.message.reply_text(
-                status_message,
-                parse_mode='Markdown'
+            self._reply(
+                update,
+                status_message
             )
             
         except Exception as e:
-            error_msg = format_error_message("Status Check Failed", str(e))
-            await update.message.reply_text(error_msg, parse_mode='Markdown')
+            error_msg = format_error_message(ErrorKind.STATUS, str(e))
+            self._reply(update, error_msg)
     
     async def query_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /query command"""
         try:
             if not context.args:
-                await update.message.reply_text(
-                    "❓ **Please provide a stock name**\n\nExample: `/query RELIANCE`",
-                    parse_mode='Markdown'
+                self._reply(
+                    update,
+                    "❓ **Please provide a stock name**\n\nExample: `/query RELIANCE`"
                 )
                 return
             
-            stock_name = ' '.join(context.args).upper().strip()
+            stock_name = _normalize_query(' '.join(context.args))
             await self._process_stock_query(update, stock_name)
             
         except Exception as e:
-            error_msg = format_error_message("Query Failed", str(e))
-            await update.message.reply_text(error_msg, parse_mode='Markdown')
+            error_msg = format_error_message(ErrorKind.QUERY, str(e))
+            self._reply(update, error_msg)
     
     async def list_stocks_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /list command"""
         try:
-            stocks = self.data_processor.get_all_stocks_today()
+            page = await self._render_list_page(0)
             
-            if not stocks:
-                await update.message.reply_text(
-                    "📭 **No stocks available**\n\nNo data has been collected today yet.",
-                    parse_mode='Markdown'
+            if not page:
+                self._reply(
+                    update,
+                    "📭 **No stocks available**\n\nNo data has been collected today yet."
                 )
                 return
             
-            # Format stock list
-            from utils import format_stock_list
-            pages = format_stock_list(stocks)
-            
-            # Send first page
-            if pages:
-                await update.message.reply_text(
-                    pages[0],
-                    parse_mode='Markdown'
-                )
+            # Send first page; later pages are rendered on demand from the buttons
+            page_text, keyboard = page
+            self._reply(update, page_text, reply_markup=keyboard)
             
         except Exception as e:
-            error_msg = format_error_message("List Stocks Failed", str(e))
-            await update.message.reply_text(error_msg, parse_mode='Markdown')
+            error_msg = format_error_message(ErrorKind.LIST, str(e))
+            self._reply(update, error_msg)
     
     async def history_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /history command"""
         try:
             if not context.args:
-                await update.message.reply_text(
-                    "❓ **Please provide a stock name**\n\nExample: `/history RELIANCE`",
-                    parse_mode='Markdown'
+                self._reply(
+                    update,
+                    "❓ **Please provide a stock name**\n\nExample: `/history RELIANCE`"
                 )
                 return
             
-            stock_name = ' '.join(context.args).upper().strip()
-            history = self.data_processor.get_stock_history(stock_name)
+            stock_name = _normalize_query(' '.join(context.args))
+            history, total_entries = await asyncio.to_thread(
+                self.data_processor.get_stock_history, stock_name, HISTORY_DISPLAY_LIMIT
+            )
             
             if not history:
-                await update.message.reply_text(
-                    f"📭 **No history found for {stock_name}**\n\nMake sure the stock name is correct.",
-                    parse_mode='Markdown'
+                self._reply(
+                    update,
+                    f"📭 **No history found for {stock_name}**\n\nMake sure the stock name is correct."
                 )
                 return
             
             # Format history
-            history_lines = []
-            for i, entry in enumerate(history[-10:]):  # Last 10 entries
-                timestamp = entry.get('timestamp', '')
-                serial = entry.get('serial_number', 'N/A')
-                change = entry.get('change', 0)
-                
-                try:
-                    from datetime import datetime
-                    dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                    time_str = dt.strftime('%H:%M')
-                except:
-                    time_str = timestamp[:5] if timestamp else 'N/A'
-                
-                change_indicator = ""
-                if change > 0:
-                    change_indicator = f" ⬆️(+{change})"
-                elif change < 0:
-                    change_indicator = f" ⬇️({change})"
-                
-                history_lines.append(f"`{time_str}` - Serial: `{serial}`{change_indicator}")
+            history_text = "\n".join([_format_history_line(entry) for entry in history])
             
             history_message = f"""
 📈 **History for {stock_name}**
 
-{chr(10).join(history_lines)}
+{history_text}
 
-📊 **Total Entries:** {len(history)}
-⏰ **Showing:** Last {min(10, len(history))} entries
+📊 **Total Entries:** {total_entries}
+⏰ **Showing:** Last {len(history)} entries
             """.strip()
             
-            await update.message.reply_text(
-                history_message,
-                parse_mode='Markdown'
+            self._reply(
+                update,
+                history_message
             )
             
         except Exception as e:
-            error_msg = format_error_message("History Failed", str(e))
-            await update.message.reply_text(error_msg, parse_mode='Markdown')
+            error_msg = format_error_message(ErrorKind.HISTORY, str(e))
+            self._reply(update, error_msg)
     
     async def handle_stock_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle direct stock name queries"""
         try:
-            stock_name = update.message.text.upper().strip()
+            stock_name = _normalize_query(update.message.text)
             await self._process_stock_query(update, stock_name)
             
         except Exception as e:
-            error_msg = format_error_message("Stock Query Failed", str(e))
-            await update.message.reply_text(error_msg, parse_mode='Markdown')
+            error_msg = format_error_message(ErrorKind.STOCK_QUERY, str(e))
+            self._reply(update, error_msg)
     
     async def _process_stock_query(self, update: Update, stock_name: str):
         """Process stock query and send response"""
         try:
             # Search for stock
-            stock_data = self.data_processor.search_stock(stock_name)
+            stock_data = await self._cached(
+                f"search:{stock_name}", SEARCH_CACHE_TTL, self.data_processor.search_stock, stock_name
+            )
             
             if stock_data:
                 # Format and send stock data
                 formatted_data = format_stock_data(stock_data)
-                await update.message.reply_text(
-                    formatted_data,
-                    parse_mode='Markdown'
+                self._reply(
+                    update,
+                    formatted_data
                 )
             else:
                 # Stock not found, provide suggestions
-                suggestions = self.data_processor.get_stock_suggestions(stock_name)
+                suggestions = await asyncio.to_thread(self.data_processor.get_stock_suggestions, stock_name)
                 
                 if suggestions:
                     suggestion_text = "\n".join([f"• `{s}`" for s in suggestions[:5]])
@@ -340,9 +523,9 @@ Make sure:
 • Use /list to see available stocks
                     """.strip()
                 
-                await update.message.reply_text(
-                    message,
-                    parse_mode='Markdown'
+                self._reply(
+                    update,
+                    message
                 )
                 
         except Exception as e:
@@ -354,50 +537,35 @@ Make sure:
             query = update.callback_query
             await query.answer()
             
-            if query.data == "status":
-                await self.status_command(update, context)
-            elif query.data == "list":
-                await self.list_stocks_command(update, context)
-            elif query.data == "help":
-                await self.help_command(update, context)
+            handler_name = _CALLBACK_DISPATCH.get(query.data)
+            if handler_name:
+                await getattr(self, handler_name)(update, context)
             elif query.data == "sample":
-                # Send a sample query
-                sample_message = """
-📈 **Sample Stock Query**
-
-Try sending me any of these:
-• `RELIANCE`
-• `TCS`
-• `HDFC`
-• `INFY`
-• `/query WIPRO`
-• `/history SBIN`
-
-Just type the stock name or use the commands!
-                """.strip()
-                
-                await query.edit_message_text(
-                    sample_message,
-                    parse_mode='Markdown'
-                )
+                await query.edit_message_text(_SAMPLE_MESSAGE)
+            elif query.data.startswith("list:"):
+                # Page index travels in the callback data, nothing is kept server-side
+                page = await self._render_list_page(int(query.data[5:]))
+                if page:
+                    page_text, keyboard = page
+                    await query.edit_message_text(page_text, reply_markup=keyboard)
                 
         except Exception as e:
-            logger.error(f"Button callback error: {e}")
+            logger.error("Button callback error: %s", e)
     
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors"""
         try:
-            logger.error(f"Update {update} caused error {context.error}")
+            logger.error("Update %s caused error %s", update, context.error)
             
             if update and update.effective_message:
                 error_msg = format_error_message(
-                    "Bot Error", 
+                    ErrorKind.BOT,
                     "An unexpected error occurred. Please try again."
                 )
-                await update.effective_message.reply_text(
-                    error_msg,
-                    parse_mode='Markdown'
+                self._reply(
+                    update,
+                    error_msg
                 )
                 
         except Exception as e:
-            logger.error(f"Error in error handler: {e}")
+            logger.error("Error in error handler: %s", e)
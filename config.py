@@ -2,14 +2,22 @@
 Configuration management for NSE OI Spurts Bot
 """
 
+import logging
 import os
-from datetime import time
+from datetime import date, time
+
+logger = logging.getLogger(__name__)
 
 class Config:
     """Application configuration"""
     
     # Bot Configuration
-    BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "8095839692:AAGtMCXOuAcDURa-VmDDFrq3UXqzfBbaH1g")
+    BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")  # Required, checked at startup
+    
+    # Webhook Configuration (Telegram pushes updates to PUBLIC_URL/<token>)
+    PUBLIC_URL = os.getenv("PUBLIC_URL", "").rstrip("/")
+    WEBHOOK_LISTEN = "0.0.0.0"
+    WEBHOOK_PORT = int(os.getenv("PORT", "8443"))
     
     # NSE Oi Spurts Configuration
     NSE_OI_SPURTS_URL = "https://www.nseindia.com/market-data/oi-spurts"
@@ -20,6 +28,11 @@ class Config:
     MONITORING_END_TIME = time(14, 30)   # 2:30 PM
     SCRAPING_INTERVAL_MINUTES = 20
     
+    # NSE trading holidays (weekends are always closed), read by load_nse_holidays() from
+    # the NSE_HOLIDAYS_FILE file (one ISO date per line, '#' comments) plus the comma-separated
+    # NSE_HOLIDAYS variable. No calendar ships with the bot; with neither set only weekends are skipped
+    NSE_HOLIDAYS_FILE = os.getenv("NSE_HOLIDAYS_FILE", "")
+    
     # File Configuration
     DATA_DIR = "data"
     EXCEL_DIR = os.path.join(DATA_DIR, "excel_files")
@@ -35,18 +48,59 @@ class Config:
     
     # Data Configuration
     MAX_DAILY_FILES = 50  # Maximum Excel files to keep per day
+    DATA_FILE_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.json')  # Downloaded data files (JSON from fallback APIs)
+    DATA_COMPACTION_INTERVAL = 3600  # Seconds between compactions of the daily data log
+    DATA_FLUSH_DELAY = 2  # Seconds to wait for more updates before writing a snapshot
+    MAX_HISTORY_PER_STOCK = 64  # Entries kept in memory per stock (a trading day has ~14)
     
-    def __init__(self):
-        """Initialize configuration and create necessary directories"""
-        self._create_directories()
+    _directories_created = False
     
-    def _create_directories(self):
-        """Create necessary directories if they don't exist"""
+    @classmethod
+    def load_nse_holidays(cls, year: int) -> frozenset:
+        """
+        Read the NSE holiday calendar; malformed dates are logged and skipped
+        Warns when a calendar is configured but has no holiday in the given year
+        """
+        env_holidays = os.getenv("NSE_HOLIDAYS", "")
+        if not (env_holidays or cls.NSE_HOLIDAYS_FILE):
+            logger.info("📅 No NSE holiday calendar configured (NSE_HOLIDAYS_FILE / NSE_HOLIDAYS); only weekends are skipped")
+            return frozenset()
+        
+        entries = env_holidays.split(",")
+        if cls.NSE_HOLIDAYS_FILE:
+            try:
+                with open(cls.NSE_HOLIDAYS_FILE, encoding="utf-8") as f:
+                    entries.extend(line.split("#", 1)[0] for line in f)
+            except OSError as e:
+                logger.warning(f"⚠️  Could not read {cls.NSE_HOLIDAYS_FILE}: {e}")
+        
+        holidays = set()
+        for entry in entries:
+            entry = entry.strip()
+            if not entry:
+                continue
+            try:
+                holidays.add(date.fromisoformat(entry))
+            except ValueError:
+                logger.warning(f"⚠️  Ignoring invalid NSE holiday date: {entry!r}")
+        
+        if not any(day.year == year for day in holidays):
+            logger.warning(f"⚠️  No NSE holidays configured for {year}; every weekday is treated as a trading day")
+        return frozenset(holidays)
+    
+    @classmethod
+    def ensure_directories(cls):
+        """Create necessary directories once per process (later calls are free)"""
+        if cls._directories_created:
+            return
+        
         directories = [
-            self.DATA_DIR,
-            self.EXCEL_DIR,
-            self.PROCESSED_DATA_DIR
+            cls.DATA_DIR,
+            cls.EXCEL_DIR,
+            cls.PROCESSED_DATA_DIR
         ]
         
         for directory in directories:
             os.makedirs(directory, exist_ok=True)
+        
+        cls._directories_created = True
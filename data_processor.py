@@ -4,25 +4,278 @@ Handles Excel file processing, data extraction, and storage
 """
 
 import logging
+import multiprocessing
 import os
-import json
+import sys
+import time
+import atexit
+import threading
+import importlib.util
+import hashlib
+import orjson
+import numpy as np
 import pandas as pd
-from datetime import datetime, date, time
-from typing import Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime, date
+from typing import Deque, Dict, List, Optional, Any, Tuple
 import glob
-from collections import defaultdict
+import bisect
+from collections import defaultdict, deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
 from config import Config
 from utils import normalize_stock_name, calculate_time_difference
 
 logger = logging.getLogger(__name__)
 
+# Column name keywords for NSE OI spurts files. INSTRUMENT is deliberately not one:
+# in NSE derivative files that column holds the contract type (FUTSTK/OPTSTK), not the symbol
+SYMBOL_COLUMN_KEYWORDS = frozenset({'SYMBOL', 'STOCK', 'SCRIP', 'NAME', 'COMPANY'})
+ADDITIONAL_COLUMN_KEYWORDS = ['OI', 'INTEREST', 'VOLUME', 'PRICE', 'CHANGE']
+
+# Arrow-backed columns are smaller and have native string kernels; used when pyarrow is installed
+USE_PYARROW = importlib.util.find_spec('pyarrow') is not None
+SYMBOL_DTYPE = 'string[pyarrow]' if USE_PYARROW else str
+EXCEL_READ_OPTIONS = {'dtype_backend': 'pyarrow'} if USE_PYARROW else {}
+
+def _find_symbol_column(columns, upper_cols: List[str]) -> Optional[Any]:
+    """Return the first column that looks like a stock symbol/name column"""
+    return next(
+        (col for col, upper in zip(columns, upper_cols)
+         if any(pattern in upper for pattern in SYMBOL_COLUMN_KEYWORDS)),
+        None
+    )
+
+def _is_additional_column(upper_col: str) -> bool:
+    """Check whether a column (by upper-cased name) holds additional data worth storing"""
+    return any(keyword in upper_col for keyword in ADDITIONAL_COLUMN_KEYWORDS)
+
+def _read_excel_file(file_path: str) -> Optional[pd.DataFrame]:
+    """Read Excel file with multiple fallback strategies"""
+    try:
+        # Fallback API data is saved as a JSON list of records
+        if file_path.endswith('.json'):
+            try:
+                with open(file_path, 'rb') as f:
+                    df = pd.DataFrame(orjson.loads(f.read()))
+                if not df.empty:
+                    logger.debug("📋 Successfully read as JSON records")
+                    return df
+            except Exception as e:
+                logger.debug(f"Failed to read as JSON: {e}")
+        
+        # First, try the Rust-based calamine engine (reads both .xlsx and .xls)
+        try:
+            df = _read_excel_columns(file_path, 'calamine')
+            if not df.empty:
+                logger.debug("📋 Successfully read as Excel file (calamine)")
+                return df
+        except Exception as e:
+            logger.debug(f"Failed to read with calamine: {e}")
+        
+        # Fall back to openpyxl
+        try:
+            df = _read_excel_columns(file_path, 'openpyxl')
+            if not df.empty:
+                logger.debug("📋 Successfully read as Excel file")
+                return df
+        except Exception as e:
+            logger.debug(f"Failed to read as Excel: {e}")
+        
+        # Try with xlrd engine for older Excel files
+        try:
+            df = _read_excel_columns(file_path, 'xlrd')
+            if not df.empty:
+                logger.debug("📋 Successfully read as legacy Excel file")
+                return df
+        except Exception as e:
+            logger.debug(f"Failed to read as legacy Excel: {e}")
+        
+        # Try to read as CSV (sometimes NSE serves CSV with .xlsx extension)
+        try:
+            df = pd.read_csv(file_path)
+            if not df.empty:
+                logger.debug("📋 Successfully read as CSV file")
+                return df
+        except Exception as e:
+            logger.debug(f"Failed to read as CSV: {e}")
+        
+        # Try to read with different encodings
+        for encoding in ['utf-8', 'latin-1', 'cp1252']:
+            try:
+                df = pd.read_csv(file_path, encoding=encoding)
+                if not df.empty:
+                    logger.debug(f"📋 Successfully read as CSV with {encoding} encoding")
+                    return df
+            except Exception:
+                continue
+        
+        logger.error("❌ Could not read file with any method")
+        return None
+    
+    except Exception as e:
+        logger.error(f"❌ Error reading file: {e}")
+        return None
+
+def _read_excel_columns(file_path: str, engine: str) -> pd.DataFrame:
+    """Read only the symbol and additional data columns of an Excel file"""
+    # Cheap header-only read to discover the layout
+    columns = list(pd.read_excel(file_path, engine=engine, nrows=0).columns)
+    if not columns:
+        return pd.DataFrame()
+    
+    symbol_col, additional_cols = _resolve_schema(tuple(columns))
+    if symbol_col is None:
+        # _extract_stock_data falls back to the first column
+        symbol_col = columns[0]
+    
+    # Select by position: headers are not always strings (e.g. a numeric header
+    # cell), and pandas rejects a usecols list of mixed label types
+    symbol_pos = columns.index(symbol_col)
+    keep = sorted({symbol_pos, *(pos for pos, _ in additional_cols)})
+    # Integer dtype keys refer to positions among the selected columns
+    dtype = {keep.index(symbol_pos): SYMBOL_DTYPE}
+    return pd.read_excel(file_path, engine=engine, usecols=keep, dtype=dtype, **EXCEL_READ_OPTIONS)
+
+@lru_cache(maxsize=32)
+def _resolve_schema(columns: tuple) -> Tuple[Any, List[Tuple[int, str]]]:
+    """
+    Resolve the symbol column and additional data columns for a column layout
+    NSE files keep the same layout all day, so results are memoized per layout
+    """
+    # Stringify each header once and share it between both checks
+    col_names = [str(col) for col in columns]
+    upper_cols = [name.strip().upper() for name in col_names]
+    
+    additional_cols = [
+        (pos, f'additional_{col_names[pos].lower()}')
+        for pos, upper in enumerate(upper_cols)
+        if _is_additional_column(upper)
+    ]
+    return _find_symbol_column(columns, upper_cols), additional_cols
+
+def _extract_stock_data(df: pd.DataFrame, file_path: str) -> List[Dict]:
+    """Extract stock names and serial numbers from DataFrame"""
+    try:
+        logger.debug(f"📊 DataFrame shape: {df.shape}")
+        logger.debug(f"📊 DataFrame columns: {list(df.columns)}")
+        
+        # Print first few rows for debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📊 Sample data:")
+            for i, record in enumerate(df.head(3).to_dict('records')):
+                logger.debug(f"  Row {i}: {record}")
+        
+        # Find the symbol/stock name and additional data columns
+        symbol_col, additional_cols = _resolve_schema(tuple(df.columns))
+        
+        if symbol_col is None and len(df.columns) > 0:
+            # Use first column as symbol if no match found
+            symbol_col = df.columns[0]
+            logger.warning(f"⚠️  No symbol column found, using first column: {symbol_col}")
+        
+        if symbol_col is None:
+            logger.error("❌ No suitable symbol column found")
+            return []
+        
+        logger.info(f"📈 Using column '{symbol_col}' for stock symbols")
+        
+        # Clean and filter symbols column-wise instead of row by row
+        names = df[symbol_col].astype(SYMBOL_DTYPE).fillna('').str.strip().str.upper()
+        mask = (
+            (names.str.len() >= 2) &
+            ~names.isin(['NAN', 'NULL', 'NONE']) &
+            ~names.str.isdigit()
+        ).to_numpy(dtype=bool)
+        valid_names = names[mask].map(normalize_stock_name).tolist()
+        valid_index = df.index[mask].tolist()
+        source_file = sys.intern(os.path.basename(file_path))
+        
+        # Serial number is the row index + 1 (1-based indexing)
+        stock_entries = [
+            {
+                'name': stock_name,
+                'serial_number': index + 1,
+                'source_file': source_file
+            }
+            for stock_name, index in zip(valid_names, valid_index)
+        ]
+        
+        # Try to extract additional data if available
+        for pos, key in additional_cols:
+            values = df.iloc[:, pos][mask]
+            present = values.notna()
+            # Only text columns can hold empty strings; comparing numeric columns to '' is an invalid comparison
+            if pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype):
+                present &= values.ne('').fillna(False)
+            for entry, value, has_value in zip(stock_entries, values.tolist(), present.to_numpy(dtype=bool)):
+                if has_value:
+                    entry[key] = str(value)
+        
+        logger.info(f"✅ Extracted {len(stock_entries)} stock entries")
+        return stock_entries
+    
+    except Exception as e:
+        logger.error(f"❌ Error extracting stock data: {e}")
+        return []
+
+def parse_file(file_path: str) -> List[Dict]:
+    """
+    Read a downloaded file and extract its stock entries
+    Module-level (and free of DataProcessor state) so it can run in a worker process
+    """
+    df = _read_excel_file(file_path)
+    if df is None or df.empty:
+        return []
+    return _extract_stock_data(df, file_path)
+
+@dataclass(slots=True)
+class StockEntry:
+    """A single stored observation of a stock's serial number"""
+    timestamp: str
+    time_str: str
+    serial_number: int
+    source_file: str
+    change: int = 0
+    additional: Dict[str, str] = field(default_factory=dict)
+    
+    def to_dict(self) -> Dict:
+        """Flat dict form used for storage and by callers (additional_* keys inline)"""
+        return {
+            'timestamp': self.timestamp,
+            'time_str': self.time_str,
+            'serial_number': self.serial_number,
+            'source_file': self.source_file,
+            'change': self.change,
+            **self.additional
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'StockEntry':
+        """Build an entry from its flat dict form, sharing repeated strings"""
+        timestamp = sys.intern(data['timestamp'])
+        return cls(
+            timestamp=timestamp,
+            time_str=sys.intern(data.get('time_str') or timestamp[11:16]),
+            serial_number=data['serial_number'],
+            source_file=sys.intern(data.get('source_file', '')),
+            change=data.get('change', 0),
+            additional={key: value for key, value in data.items() if key.startswith('additional_')}
+        )
+
+def _new_history(entries=()) -> Deque[StockEntry]:
+    """Per-stock history, keeping only the most recent MAX_HISTORY_PER_STOCK entries in memory"""
+    return deque(entries, maxlen=Config.MAX_HISTORY_PER_STOCK)
+
 class DataProcessor:
     """Handles processing and storage of NSE Oi spurts data"""
     
     def __init__(self):
         self.config = Config()
-        self.daily_data = defaultdict(list)  # Stock name -> list of entries
+        self.config.ensure_directories()
+        self.daily_data: Dict[str, Deque[StockEntry]] = defaultdict(_new_history)  # Stock name -> recent entries
         self.current_date = date.today().isoformat()
         self.stats = {
             'successful_updates': 0,
@@ -30,7 +283,27 @@ class DataProcessor:
             'total_stocks_processed': 0,
             'start_time': datetime.now().isoformat()
         }
+        # Bumped whenever daily_data changes so readers can invalidate caches
+        self.data_version = 0
+        # Timestamp of the most recent stored batch, kept current by _store_stock_data
+        self._last_update: Optional[str] = None
+        # Content hashes of files already stored today, so re-downloads of unchanged data are skipped
+        self._processed_hashes: set = set()
+        # Name index for search: sorted names for prefix lookups, bigram -> names for substrings
+        self._sorted_names: List[str] = []
+        self._name_bigrams: Dict[str, set] = defaultdict(set)
+        # Append-only log of updates since the last snapshot (see _append_log)
+        self._log_file = None
+        self._log_date = None
+        self._log_seq = 0
+        self._last_compaction = time.monotonic()
+        # Compaction runs on a background thread once _dirty is set; _lock keeps
+        # it from serializing daily_data while a batch is being stored
+        self._lock = threading.RLock()
+        self._dirty = threading.Event()
         self.load_daily_data()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+        atexit.register(self._flush_on_exit)
     
     def process_excel_file(self, file_path: str) -> Optional[Dict]:
         """
@@ -41,39 +314,31 @@ class DataProcessor:
             logger.info(f"📊 Processing Excel file: {os.path.basename(file_path)}")
             
             # Check if file exists and is not empty
-            if not os.path.exists(file_path):
-                logger.error(f"❌ File not found: {file_path}")
-                return None
-                
-            file_size = os.path.getsize(file_path)
-            if file_size < 100:
-                logger.error(f"❌ File too small ({file_size} bytes): {file_path}")
+            file_size = self._check_file(file_path)
+            if file_size is None:
                 return None
             
+            # Skip files identical to one already stored today (NSE not updated yet)
+            file_hash = self._file_hash(file_path)
+            if self._is_duplicate(file_hash):
+                return self._duplicate_result(file_path, file_size)
+            
             # Try to read the Excel file
-            df = self._read_excel_file(file_path)
+            df = _read_excel_file(file_path)
             if df is None or df.empty:
                 logger.error("❌ Could not read Excel file or file is empty")
                 self.stats['failed_updates'] += 1
                 return None
             
             # Extract stock data
-            stock_entries = self._extract_stock_data(df, file_path)
+            stock_entries = _extract_stock_data(df, file_path)
             if not stock_entries:
                 logger.warning("⚠️  No stock data extracted from file")
                 self.stats['failed_updates'] += 1
                 return None
             
             # Store the processed data
-            timestamp = datetime.now().isoformat()
-            processed_count = self._store_stock_data(stock_entries, timestamp)
-            
-            # Update statistics
-            self.stats['successful_updates'] += 1
-            self.stats['total_stocks_processed'] += processed_count
-            
-            # Save daily data
-            self._save_daily_data()
+            timestamp, processed_count = self._record_batch(stock_entries, file_hash)
             
             result = {
                 'success': True,
@@ -92,177 +357,213 @@ class DataProcessor:
             self.stats['failed_updates'] += 1
             return None
     
-    def _read_excel_file(self, file_path: str) -> Optional[pd.DataFrame]:
-        """Read Excel file with multiple fallback strategies"""
+    def process_unstored_files(self) -> int:
+        """
+        Store today's data files downloaded after the last stored batch, e.g. when the
+        bot stopped between a download and its processing; returns the number stored
+        """
         try:
-            # First, try to read as Excel
-            try:
-                df = pd.read_excel(file_path, engine='openpyxl')
-                if not df.empty:
-                    logger.debug("📋 Successfully read as Excel file")
-                    return df
-            except Exception as e:
-                logger.debug(f"Failed to read as Excel: {e}")
-            
-            # Try with xlrd engine for older Excel files
-            try:
-                df = pd.read_excel(file_path, engine='xlrd')
-                if not df.empty:
-                    logger.debug("📋 Successfully read as legacy Excel file")
-                    return df
-            except Exception as e:
-                logger.debug(f"Failed to read as legacy Excel: {e}")
+            today = date.today()
+            last_update = datetime.fromisoformat(self._last_update).timestamp() if self._last_update else 0
             
-            # Try to read as CSV (sometimes NSE serves CSV with .xlsx extension)
-            try:
-                df = pd.read_csv(file_path)
-                if not df.empty:
-                    logger.debug("📋 Successfully read as CSV file")
-                    return df
-            except Exception as e:
-                logger.debug(f"Failed to read as CSV: {e}")
+            pending = []
+            with os.scandir(self.config.EXCEL_DIR) as it:
+                for entry in it:
+                    if not (entry.is_file() and entry.name.endswith(self.config.DATA_FILE_EXTENSIONS)):
+                        continue
+                    mtime = entry.stat().st_mtime
+                    if mtime > last_update and date.fromtimestamp(mtime) == today:
+                        pending.append((mtime, entry.path))
             
-            # Try to read with different encodings
-            for encoding in ['utf-8', 'latin-1', 'cp1252']:
-                try:
-                    df = pd.read_csv(file_path, encoding=encoding)
-                    if not df.empty:
-                        logger.debug(f"📋 Successfully read as CSV with {encoding} encoding")
-                        return df
-                except Exception:
-                    continue
+            if not pending:
+                return 0
             
-            logger.error("❌ Could not read file with any method")
-            return None
+            logger.info(f"📂 Found {len(pending)} downloaded files not yet stored")
+            results = self.process_excel_files_batch([path for _, path in sorted(pending)])
+            return sum(1 for result in results if result and result.get('stocks_processed'))
             
         except Exception as e:
-            logger.error(f"❌ Error reading file: {e}")
-            return None
+            logger.error(f"❌ Error processing unstored files: {e}")
+            return 0
     
-    def _extract_stock_data(self, df: pd.DataFrame, file_path: str) -> List[Dict]:
-        """Extract stock names and serial numbers from DataFrame"""
+    def process_excel_files_batch(self, file_paths: List[str]) -> List[Optional[Dict]]:
+        """
+        Process several downloaded files (e.g. a backfill), parsing them in parallel
+        Files are parsed in worker processes and stored in the given order
+        """
+        results: List[Optional[Dict]] = [None] * len(file_paths)
         try:
-            stock_entries = []
-            
-            logger.debug(f"📊 DataFrame shape: {df.shape}")
-            logger.debug(f"📊 DataFrame columns: {list(df.columns)}")
-            
-            # Print first few rows for debugging
-            logger.debug("📊 Sample data:")
-            for i, row in df.head(3).iterrows():
-                logger.debug(f"  Row {i}: {dict(row)}")
-            
-            # Common patterns for NSE OI spurts data columns
-            symbol_columns = ['SYMBOL', 'Symbol', 'symbol', 'STOCK', 'Stock', 'stock', 
-                            'SCRIP', 'Scrip', 'scrip', 'NAME', 'Name', 'name',
-                            'COMPANY', 'Company', 'company', 'INSTRUMENT', 'Instrument']
-            
-            # Find the symbol/stock name column
-            symbol_col = None
-            for col in df.columns:
-                if any(pattern in str(col).upper() for pattern in ['SYMBOL', 'STOCK', 'SCRIP', 'NAME']):
-                    symbol_col = col
-                    break
-                    
-            if symbol_col is None and len(df.columns) > 0:
-                # Use first column as symbol if no match found
-                symbol_col = df.columns[0]
-                logger.warning(f"⚠️  No symbol column found, using first column: {symbol_col}")
-            
-            if symbol_col is None:
-                logger.error("❌ No suitable symbol column found")
-                return []
-            
-            logger.info(f"📈 Using column '{symbol_col}' for stock symbols")
-            
-            # Process each row
-            for index, row in df.iterrows():
-                try:
-                    # Get stock symbol/name
-                    stock_name = str(row[symbol_col]).strip().upper()
+            file_sizes = {}
+            file_hashes = {}
+            for i, file_path in enumerate(file_paths):
+                file_size = self._check_file(file_path)
+                if file_size is None:
+                    continue
+                
+                file_hash = self._file_hash(file_path)
+                if self._is_duplicate(file_hash) or file_hash in file_hashes.values():
+                    results[i] = self._duplicate_result(file_path, file_size)
+                    continue
+                
+                file_sizes[i] = file_size
+                file_hashes[i] = file_hash
+            
+            if not file_sizes:
+                return results
+            
+            logger.info(f"📊 Processing {len(file_sizes)} files in parallel")
+            # Spawned workers: this process already runs threads (flush thread, bot event
+            # loop, to_thread workers), and forking a threaded process can deadlock
+            with ProcessPoolExecutor(
+                max_workers=min(len(file_sizes), os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context('spawn')
+            ) as executor:
+                futures = {i: executor.submit(parse_file, file_paths[i]) for i in file_sizes}
+                
+                # Merge serially, in order, so change values match one-by-one processing
+                for i, future in futures.items():
+                    file_path = file_paths[i]
+                    try:
+                        stock_entries = future.result()
+                    except Exception as e:
+                        logger.error(f"❌ Error parsing file {file_path}: {e}")
+                        stock_entries = []
                     
-                    # Skip invalid entries
-                    if (not stock_name or 
-                        stock_name in ['NAN', 'NULL', '', 'NONE'] or 
-                        len(stock_name) < 2 or
-                        stock_name.isdigit()):
+                    if not stock_entries:
+                        logger.warning(f"⚠️  No stock data extracted from {os.path.basename(file_path)}")
+                        self.stats['failed_updates'] += 1
                         continue
                     
-                    # Clean stock name
-                    stock_name = normalize_stock_name(stock_name)
-                    
-                    # Serial number is the row index + 1 (1-based indexing)
-                    serial_number = index + 1
-                    
-                    entry = {
-                        'name': stock_name,
-                        'serial_number': serial_number,
-                        'row_index': index,
-                        'source_file': os.path.basename(file_path)
+                    timestamp, processed_count = self._record_batch(stock_entries, file_hashes[i])
+                    results[i] = {
+                        'success': True,
+                        'file_path': file_path,
+                        'timestamp': timestamp,
+                        'stocks_processed': processed_count,
+                        'file_size': file_sizes[i]
                     }
-                    
-                    # Try to extract additional data if available
-                    for col in df.columns:
-                        col_name = str(col).upper()
-                        if any(keyword in col_name for keyword in ['OI', 'INTEREST', 'VOLUME', 'PRICE', 'CHANGE']):
-                            try:
-                                value = row[col]
-                                if pd.notna(value) and value != '':
-                                    entry[f'additional_{col_name.lower()}'] = str(value)
-                            except:
-                                pass
-                    
-                    stock_entries.append(entry)
-                    
-                except Exception as e:
-                    logger.debug(f"⚠️  Error processing row {index}: {e}")
-                    continue
             
-            logger.info(f"✅ Extracted {len(stock_entries)} stock entries")
-            return stock_entries
+            logger.info(f"✅ Processed {sum(1 for result in results if result)} of {len(file_paths)} files")
+            return results
             
         except Exception as e:
-            logger.error(f"❌ Error extracting stock data: {e}")
-            return []
+            logger.error(f"❌ Error processing file batch: {e}")
+            return results
+    
+    def _check_file(self, file_path: str) -> Optional[int]:
+        """Return the size of a downloaded file, or None if it is missing or too small"""
+        if not os.path.exists(file_path):
+            logger.error(f"❌ File not found: {file_path}")
+            return None
+            
+        file_size = os.path.getsize(file_path)
+        if file_size < 100:
+            logger.error(f"❌ File too small ({file_size} bytes): {file_path}")
+            return None
+        
+        return file_size
+    
+    def _file_hash(self, file_path: str) -> str:
+        """Content hash of a downloaded file"""
+        with open(file_path, 'rb') as f:
+            return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+    
+    def _is_duplicate(self, file_hash: str) -> bool:
+        """Check whether a file with this content was already stored today"""
+        return file_hash in self._processed_hashes and self.current_date == date.today().isoformat()
+    
+    def _duplicate_result(self, file_path: str, file_size: int) -> Dict:
+        """Processing result for a file skipped as a duplicate"""
+        logger.info(f"⏭️  Skipping {os.path.basename(file_path)}: same content as an already processed file")
+        return {
+            'success': True,
+            'duplicate': True,
+            'file_path': file_path,
+            'stocks_processed': 0,
+            'file_size': file_size
+        }
+    
+    def _record_batch(self, stock_entries: List[Dict], file_hash: Optional[str] = None) -> Tuple[str, int]:
+        """Store one file's stock entries and update statistics; returns (timestamp, count)"""
+        timestamp = datetime.now().isoformat()
+        with self._lock:
+            processed_count = self._store_stock_data(stock_entries, timestamp)
+            
+            # Update statistics
+            self.stats['successful_updates'] += 1
+            self.stats['total_stocks_processed'] += processed_count
+            
+            # Log the new stats (and file hash); the full snapshot is only rewritten
+            # periodically, by the flush thread
+            record = {'seq': self._log_seq, 'stats': self.stats}
+            if file_hash:
+                self._processed_hashes.add(file_hash)
+                record['file_hash'] = file_hash
+            self._append_log([record])
+        
+        if time.monotonic() - self._last_compaction >= self.config.DATA_COMPACTION_INTERVAL:
+            self._dirty.set()
+        
+        return timestamp, processed_count
     
     def _store_stock_data(self, stock_entries: List[Dict], timestamp: str) -> int:
         """Store processed stock data in daily storage"""
         try:
             processed_count = 0
-            current_date = date.today().isoformat()
+            # The batch timestamp is local ISO time, so its date part is today's date
+            current_date = timestamp[:10]
             
             # Clear old data if date changed
             if self.current_date != current_date:
                 logger.info(f"📅 Date changed from {self.current_date} to {current_date}, clearing old data")
                 self.daily_data.clear()
+                self._rebuild_name_index()
+                self._last_update = None
+                self._processed_hashes.clear()
                 self.current_date = current_date
-            
-            for entry in stock_entries:
+                self._log_seq = 0
+            
+            # Display time is shared by the whole batch; HH:MM of the ISO timestamp
+            timestamp = sys.intern(timestamp)
+            time_str = sys.intern(timestamp[11:16])
+            
+            self._log_seq += 1
+            log_records = []
+            
+            # Change from each stock's previous entry (0 for first sightings), computed in one pass
+            serials = np.fromiter((entry['serial_number'] for entry in stock_entries), dtype=np.int64, count=len(stock_entries))
+            prev_serials = np.fromiter(
+                (
+                    self.daily_data[entry['name']][-1].serial_number if self.daily_data.get(entry['name']) else entry['serial_number']
+                    for entry in stock_entries
+                ),
+                dtype=np.int64,
+                count=len(stock_entries)
+            )
+            changes = (serials - prev_serials).tolist()
+            
+            for entry, change in zip(stock_entries, changes):
                 stock_name = entry['name']
+                if stock_name not in self.daily_data:
+                    self._index_name(stock_name)
                 
-                # Create storage entry
-                storage_entry = {
-                    'timestamp': timestamp,
-                    'serial_number': entry['serial_number'],
-                    'source_file': entry['source_file'],
-                    'date': current_date
-                }
-                
-                # Add additional data if available
-                for key, value in entry.items():
-                    if key.startswith('additional_'):
-                        storage_entry[key] = value
-                
-                # Calculate change from previous entry if available
-                if stock_name in self.daily_data and self.daily_data[stock_name]:
-                    prev_serial = self.daily_data[stock_name][-1]['serial_number']
-                    storage_entry['change'] = entry['serial_number'] - prev_serial
-                else:
-                    storage_entry['change'] = 0
+                # Create storage entry, with additional data if available
+                storage_entry = StockEntry(
+                    timestamp=timestamp,
+                    time_str=time_str,
+                    serial_number=entry['serial_number'],
+                    source_file=entry['source_file'],
+                    change=change,
+                    additional={key: value for key, value in entry.items() if key.startswith('additional_')}
+                )
                 
                 self.daily_data[stock_name].append(storage_entry)
+                log_records.append({'seq': self._log_seq, 'stock': stock_name, **storage_entry.to_dict()})
                 processed_count += 1
             
+            self._last_update = timestamp
+            self.data_version += 1
+            self._append_log(log_records)
             logger.info(f"💾 Stored data for {processed_count} stocks")
             return processed_count
             
@@ -280,11 +581,10 @@ class DataProcessor:
                 latest_entry = self.daily_data[query][-1]
                 return self._format_stock_result(query, latest_entry)
             
-            # Partial match
-            for stock_name in self.daily_data:
-                if query in stock_name or stock_name.startswith(query):
-                    latest_entry = self.daily_data[stock_name][-1]
-                    return self._format_stock_result(stock_name, latest_entry)
+            # Partial match, preferring names that start with the query
+            for stock_name in self._match_names(query, 1):
+                latest_entry = self.daily_data[stock_name][-1]
+                return self._format_stock_result(stock_name, latest_entry)
             
             return None
             
@@ -292,37 +592,37 @@ class DataProcessor:
             logger.error(f"❌ Error searching for stock '{query}': {e}")
             return None
     
-    def _format_stock_result(self, stock_name: str, entry: Dict) -> Dict:
+    def _format_stock_result(self, stock_name: str, entry: StockEntry) -> Dict:
         """Format stock data for display"""
         try:
-            result = {
+            return {
                 'name': stock_name,
-                'serial_number': entry['serial_number'],
-                'timestamp': entry['timestamp'],
-                'date': entry['date'],
-                'change': entry.get('change', 0),
-                'source_file': entry['source_file']
+                'serial_number': entry.serial_number,
+                'timestamp': entry.timestamp,
+                'date': self.current_date,
+                'change': entry.change,
+                'source_file': entry.source_file,
+                **entry.additional
             }
             
-            # Add additional data
-            for key, value in entry.items():
-                if key.startswith('additional_'):
-                    result[key] = value
-            
-            return result
-            
         except Exception as e:
             logger.error(f"❌ Error formatting stock result: {e}")
             return {}
     
-    def get_stock_history(self, stock_name: str) -> List[Dict]:
-        """Get historical data for a stock"""
+    def get_stock_history(self, stock_name: str, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """
+        Get historical data for a stock
+        Returns (most recent `limit` entries, total entry count)
+        """
         try:
             stock_name = normalize_stock_name(stock_name)
-            return self.daily_data.get(stock_name, [])
+            entries = self.daily_data.get(stock_name, [])
+            if limit is not None and len(entries) > limit:
+                return [entry.to_dict() for entry in islice(entries, len(entries) - limit, None)], len(entries)
+            return [entry.to_dict() for entry in entries], len(entries)
         except Exception as e:
             logger.error(f"❌ Error getting stock history: {e}")
-            return []
+            return [], 0
     
     def get_all_stocks_today(self) -> List[Dict]:
         """Get all stocks with their latest data"""
@@ -333,9 +633,9 @@ class DataProcessor:
                     latest = entries[-1]
                     stocks.append({
                         'name': stock_name,
-                        'serial_number': latest['serial_number'],
-                        'timestamp': latest['timestamp'],
-                        'change': latest.get('change', 0)
+                        'serial_number': latest.serial_number,
+                        'timestamp': latest.timestamp,
+                        'change': latest.change
                     })
             return stocks
         except Exception as e:
@@ -346,18 +646,62 @@ class DataProcessor:
         """Get stock name suggestions based on partial query"""
         try:
             query = normalize_stock_name(query)
-            suggestions = []
-            
-            for stock_name in self.daily_data:
-                if query in stock_name:
-                    suggestions.append(stock_name)
-            
-            return sorted(suggestions)[:10]  # Return top 10 matches
+            return self._match_names(query, 10)
             
         except Exception as e:
             logger.error(f"❌ Error getting stock suggestions: {e}")
             return []
     
+    def _index_name(self, stock_name: str):
+        """Add a new stock name to the sorted name list and bigram index"""
+        bisect.insort(self._sorted_names, stock_name)
+        for i in range(len(stock_name) - 1):
+            self._name_bigrams[stock_name[i:i + 2]].add(stock_name)
+    
+    def _rebuild_name_index(self):
+        """Rebuild the name index after daily_data is replaced or cleared"""
+        self._sorted_names = []
+        self._name_bigrams = defaultdict(set)
+        for stock_name in sorted(self.daily_data):
+            self._index_name(stock_name)
+    
+    def _match_names(self, query: str, limit: int) -> List[str]:
+        """
+        Find up to `limit` stock names containing the query
+        Prefix matches come first (sorted), then other substring matches (sorted)
+        """
+        names = self._sorted_names
+        matches = []
+        
+        # Prefix matches are a contiguous run of the sorted list
+        i = bisect.bisect_left(names, query)
+        while i < len(names) and len(matches) < limit and names[i].startswith(query):
+            matches.append(names[i])
+            i += 1
+        
+        if len(matches) >= limit:
+            return matches
+        
+        # Substring matches: candidates must contain every bigram of the query
+        if len(query) >= 2:
+            candidates = None
+            for j in range(len(query) - 1):
+                bigram_names = self._name_bigrams.get(query[j:j + 2], set())
+                candidates = bigram_names if candidates is None else candidates & bigram_names
+                if not candidates:
+                    return matches
+            candidates = sorted(name for name in candidates if query in name)
+        else:
+            candidates = [name for name in names if query in name]
+        
+        for name in candidates:
+            if len(matches) >= limit:
+                break
+            if not name.startswith(query):
+                matches.append(name)
+        
+        return matches
+    
     def get_bot_status(self) -> Dict:
         """Get comprehensive bot status information"""
         try:
@@ -368,30 +712,22 @@ class DataProcessor:
             in_market_hours = (self.config.MONITORING_START_TIME <= current_time <= self.config.MONITORING_END_TIME)
             
             # Count files today
-            today_str = date.today().strftime('%Y%m%d')
-            excel_files = glob.glob(os.path.join(self.config.EXCEL_DIR, f"*{today_str}*.xlsx"))
-            excel_files.extend(glob.glob(os.path.join(self.config.EXCEL_DIR, f"*{today_str}*.xls")))
-            excel_files.extend(glob.glob(os.path.join(self.config.EXCEL_DIR, f"*{today_str}*.csv")))
+            today_str = now.strftime('%Y%m%d')
+            with os.scandir(self.config.EXCEL_DIR) as it:
+                files_today = sum(
+                    1 for file_entry in it
+                    if today_str in file_entry.name and file_entry.name.endswith(self.config.DATA_FILE_EXTENSIONS)
+                )
             
             # Calculate uptime
             start_time = datetime.fromisoformat(self.stats['start_time'])
             uptime = calculate_time_difference(start_time, now)
             
-            # Get last update time
-            last_update = None
-            if self.daily_data:
-                all_entries = []
-                for entries in self.daily_data.values():
-                    all_entries.extend(entries)
-                if all_entries:
-                    latest_entry = max(all_entries, key=lambda x: x['timestamp'])
-                    last_update = latest_entry['timestamp']
-            
             return {
                 'is_active': in_market_hours,
                 'in_market_hours': in_market_hours,
-                'last_update': last_update,
-                'files_today': len(excel_files),
+                'last_update': self._last_update,
+                'files_today': files_today,
                 'total_stocks': len(self.daily_data),
                 'successful_updates': self.stats['successful_updates'],
                 'failed_updates': self.stats['failed_updates'],
@@ -409,73 +745,198 @@ class DataProcessor:
     
     def _calculate_next_update(self) -> str:
         """Calculate when the next update should occur"""
+        # Work in local seconds since midnight: the next interval boundary can
+        # cross the hour (minute 60) without any datetime.replace overflow
+        now = datetime.now()
+        interval = self.config.SCRAPING_INTERVAL_MINUTES * 60
+        seconds = now.hour * 3600 + now.minute * 60 + now.second
+        next_update = (seconds // interval + 1) * interval
+        
+        # If next update is after market hours, return end of market message
+        end_time = self.config.MONITORING_END_TIME
+        if next_update > end_time.hour * 3600 + end_time.minute * 60 + end_time.second:
+            return "After market hours"
+        
+        hours, remainder = divmod(next_update, 3600)
+        return f"{hours:02d}:{remainder // 60:02d}:00"
+    
+    def _data_file_path(self, date_str: str, extension: str = 'json') -> str:
+        """Path of the daily snapshot ('json') or update log ('ndjson') for a date"""
+        return os.path.join(self.config.PROCESSED_DATA_DIR, f"daily_data_{date_str}.{extension}")
+    
+    def _append_log(self, records: List[Dict]):
+        """Append records to today's NDJSON update log (one JSON object per line)"""
         try:
-            now = datetime.now()
-            next_update = now.replace(minute=(now.minute // 20 + 1) * 20, second=0, microsecond=0)
+            if self._log_file is None or self._log_date != self.current_date:
+                if self._log_file is not None:
+                    self._log_file.close()
+                self._log_file = open(self._data_file_path(self.current_date, 'ndjson'), 'ab')
+                self._log_date = self.current_date
             
-            # If next update is after market hours, return end of market message
-            if next_update.time() > self.config.MONITORING_END_TIME:
-                return "After market hours"
-            
-            return next_update.strftime('%H:%M:%S')
+            self._log_file.write(b''.join(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE) for record in records))
+            self._log_file.flush()
             
         except Exception as e:
-            return "Unknown"
+            logger.error(f"❌ Error appending to daily data log: {e}")
+    
+    def _flush_loop(self):
+        """Background thread: compact daily data whenever it is marked dirty"""
+        while True:
+            self._dirty.wait()
+            # Coalesce batches that arrive close together (e.g. a backfill) into one write
+            time.sleep(self.config.DATA_FLUSH_DELAY)
+            self._dirty.clear()
+            self._save_daily_data()
+    
+    def _flush_on_exit(self):
+        """Write a pending compaction before the process exits"""
+        if self._dirty.is_set():
+            self._dirty.clear()
+            self._save_daily_data()
     
     def _save_daily_data(self):
-        """Save daily data to file"""
+        """Compact daily data into a snapshot file and truncate the update log"""
         try:
-            data_file = os.path.join(self.config.PROCESSED_DATA_DIR, f"daily_data_{self.current_date}.json")
-            
-            # Convert defaultdict to regular dict for JSON serialization
-            data_to_save = {
-                'date': self.current_date,
-                'stats': self.stats,
-                'stocks': dict(self.daily_data)
-            }
-            
-            with open(data_file, 'w') as f:
-                json.dump(data_to_save, f, indent=2)
+            with self._lock:
+                data_file = self._data_file_path(self.current_date)
+                temp_file = f"{data_file}.tmp"
+                
+                # Stock history comes from disk, not daily_data, which only keeps the most
+                # recent entries per stock. 'seq' marks which log records the snapshot already contains.
+                data_to_save = {
+                    'date': self.current_date,
+                    'seq': self._log_seq,
+                    'last_update': self._last_update,
+                    'file_hashes': sorted(self._processed_hashes),
+                    'stats': self.stats,
+                    'stocks': self._persisted_history(data_file)
+                }
+                
+                with open(temp_file, 'wb') as f:
+                    f.write(orjson.dumps(data_to_save))
+                os.replace(temp_file, data_file)
+                
+                # Records up to 'seq' are now in the snapshot; replay skips them even
+                # if we stop before truncating
+                if self._log_file is not None and self._log_date == self.current_date:
+                    self._log_file.truncate(0)
+                
+                self._last_compaction = time.monotonic()
+                logger.debug(f"💾 Saved daily data to {data_file}")
                 
-            logger.debug(f"💾 Saved daily data to {data_file}")
-            
         except Exception as e:
             logger.error(f"❌ Error saving daily data: {e}")
     
+    def _persisted_history(self, data_file: str) -> Dict[str, List[Dict]]:
+        """Today's full per-stock history on disk: the previous snapshot plus logged updates since"""
+        stocks: Dict[str, List[Dict]] = {}
+        snapshot_seq = 0
+        if os.path.exists(data_file):
+            with open(data_file, 'rb') as f:
+                data = orjson.loads(f.read())
+            if data.get('date') == self.current_date:
+                stocks = data.get('stocks') or {}
+                snapshot_seq = data.get('seq', 0)
+        
+        log_file = self._data_file_path(self.current_date, 'ndjson')
+        if os.path.exists(log_file):
+            with open(log_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = orjson.loads(line)
+                    except ValueError:
+                        continue  # Partially written line from an interrupted append
+                    
+                    # Stats records carry no 'stock'; they are covered by self.stats
+                    if 'stock' not in record or record.pop('seq', 0) <= snapshot_seq:
+                        continue
+                    stocks.setdefault(record.pop('stock'), []).append(record)
+        return stocks
+    
     def load_daily_data(self):
-        """Load daily data from file"""
+        """Load daily data from the snapshot file, then replay the update log"""
         try:
-            current_date = date.today().isoformat()
-            data_file = os.path.join(self.config.PROCESSED_DATA_DIR, f"daily_data_{current_date}.json")
-            
-            if os.path.exists(data_file):
-                with open(data_file, 'r') as f:
-                    data = json.load(f)
+            with self._lock:
+                current_date = date.today().isoformat()
+                data_file = self._data_file_path(current_date)
+                log_file = self._data_file_path(current_date, 'ndjson')
+                snapshot_seq = 0
                 
-                if data.get('date') == current_date:
-                    self.daily_data = defaultdict(list, data.get('stocks', {}))
-                    self.stats.update(data.get('stats', {}))
-                    logger.info(f"📂 Loaded daily data with {len(self.daily_data)} stocks")
+                if os.path.exists(data_file):
+                    with open(data_file, 'rb') as f:
+                        data = orjson.loads(f.read())
+                    
+                    if data.get('date') == current_date:
+                        # Fill the defaultdict directly rather than copying an intermediate dict
+                        self.daily_data = defaultdict(_new_history)
+                        self.daily_data.update(
+                            (stock_name, _new_history(StockEntry.from_dict(entry) for entry in entries))
+                            for stock_name, entries in (data.get('stocks') or {}).items()
+                        )
+                        self.stats.update(data.get('stats', {}))
+                        snapshot_seq = data.get('seq', 0)
+                        self._processed_hashes = set(data.get('file_hashes', []))
+                        # Older snapshots predate 'last_update'; fall back to the newest stored entry
+                        self._last_update = data.get('last_update') or max(
+                            (entries[-1].timestamp for entries in self.daily_data.values() if entries),
+                            default=None
+                        )
+                        self.data_version += 1
+                        logger.info(f"📂 Loaded daily data with {len(self.daily_data)} stocks")
+                    else:
+                        logger.info("📅 Data file is from different date, starting fresh")
                 else:
-                    logger.info("📅 Data file is from different date, starting fresh")
-            else:
-                logger.info("📂 No existing daily data file found, starting fresh")
+                    logger.info("📂 No existing daily data file found, starting fresh")
                 
+                self._log_seq = snapshot_seq
+                if os.path.exists(log_file):
+                    replayed = 0
+                    with open(log_file, 'rb') as f:
+                        for line in f:
+                            try:
+                                record = orjson.loads(line)
+                            except ValueError:
+                                continue  # Partially written line from an interrupted append
+                            
+                            seq = record.pop('seq', 0)
+                            if seq <= snapshot_seq:
+                                continue
+                            
+                            self._log_seq = max(self._log_seq, seq)
+                            if 'stats' in record:
+                                self.stats.update(record['stats'])
+                                if 'file_hash' in record:
+                                    self._processed_hashes.add(record['file_hash'])
+                            else:
+                                entry = StockEntry.from_dict(record)
+                                self.daily_data[record.pop('stock')].append(entry)
+                                self._last_update = max(self._last_update or '', entry.timestamp)
+                                replayed += 1
+                    
+                    if replayed:
+                        self.data_version += 1
+                        logger.info(f"📂 Replayed {replayed} logged updates")
+                
+                self._rebuild_name_index()
+                    
         except Exception as e:
             logger.error(f"❌ Error loading daily data: {e}")
             # Continue with empty data
-            self.daily_data = defaultdict(list)
+            self.daily_data = defaultdict(_new_history)
+            self._rebuild_name_index()
+            self.data_version += 1
     
     def cleanup_old_data(self, days_to_keep: int = 7):
         """Clean up old data files"""
         try:
             current_date = date.today()
-            data_files = glob.glob(os.path.join(self.config.PROCESSED_DATA_DIR, "daily_data_*.json"))
+            # Snapshot (.json) and update log (.ndjson) files
+            data_files = glob.glob(os.path.join(self.config.PROCESSED_DATA_DIR, "daily_data_*.*json"))
             
             for file_path in data_files:
                 try:
                     filename = os.path.basename(file_path)
-                    date_str = filename.replace('daily_data_', '').replace('.json', '')
+                    date_str = filename.replace('daily_data_', '').split('.', 1)[0]
                     file_date = datetime.strptime(date_str, '%Y-%m-%d').date()
                     
                     if (current_date - file_date).days > days_to_keep:
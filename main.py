@@ -4,15 +4,11 @@ NSE Oi Spurts Telegram Bot - Main Entry Point
 Monitors NSE India Oi Spurts data and provides Telegram bot interface
 """
 
-import asyncio
 import logging
 import os
 import signal
 import sys
-from datetime import datetime
 from threading import Thread
-import time
-import threading
 
 from bot_handler import TelegramBotHandler
 from scheduler import DataScheduler
@@ -61,7 +57,7 @@ class NSEOIBot:
             
             logger.info("📈 Starting data scheduler...")
             
-            # Start the Telegram bot (this is blocking with run_polling)
+            # Start the Telegram bot (this is blocking with run_webhook/run_polling)
             self.bot_handler.start()
             
             logger.info("✅ Bot started successfully!")
@@ -76,9 +72,10 @@ class NSEOIBot:
         """Run the data scheduler in a separate thread"""
         try:
             logger.info("📊 Starting data scheduler...")
+            self.scheduler.store_pending_downloads()
             while self.running:
                 self.scheduler.run_pending()
-                time.sleep(60)  # Check every minute
+                self.scheduler.wait_for_next_job()
         except Exception as e:
             logger.error(f"❌ Scheduler error: {e}")
             
@@ -94,6 +91,11 @@ class NSEOIBot:
 
 def main():
     """Main entry point"""
+    # Fail fast before building the scheduler, processor and bot application
+    if not Config.BOT_TOKEN:
+        logger.error("❌ TELEGRAM_BOT_TOKEN environment variable is not set")
+        sys.exit(1)
+    
     try:
         bot = NSEOIBot()
         bot.start()
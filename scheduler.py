@@ -4,11 +4,13 @@ Handles automated data collection timing and task management
 """
 
 import logging
-import schedule
-import time
-from datetime import datetime, time as dt_time
+import bisect
+import itertools
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, time as dt_time
 import threading
-from typing import Optional
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
 
 from config import Config
 from scraper import NSEScraper
@@ -16,16 +18,39 @@ from data_processor import DataProcessor
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class ScheduledJob:
+    """A job that runs every `interval`, starting at its first next_run"""
+    func: Callable[[], None]
+    interval: timedelta
+
 class DataScheduler:
     """Handles scheduling of automated data collection tasks"""
     
+    # Job kinds skipped on weekends and NSE holidays
+    _TRADING_DAY_KINDS = frozenset({'collect', 'daily'})
+    
     def __init__(self):
         self.config = Config()
         self.scraper = NSEScraper()
         self.processor = DataProcessor()
         self.running = False
         self.last_run_time = None
+        self._last_run_iso = None  # last_run_time, formatted once when set
         self.next_run_time = None
+        # Jobs partitioned by kind, each queue sorted by (next_run, tie-breaker);
+        # the next job due is the earliest of the three queue heads
+        self._queues: Dict[str, Deque[Tuple[datetime, int, ScheduledJob]]] = {
+            'collect': deque(),
+            'daily': deque(),
+            'maint': deque()
+        }
+        self._job_counter = itertools.count()
+        # Set by stop() to wake the run loop immediately
+        self._wake = threading.Event()
+        # NSE holiday calendar, reloaded when the year changes
+        self._holidays_year = date.today().year
+        self._holidays = self.config.load_nse_holidays(self._holidays_year)
         
         self._setup_schedule()
     
@@ -33,61 +58,71 @@ class DataScheduler:
         """Setup the data collection schedule"""
         try:
             # Clear any existing jobs
-            schedule.clear()
+            for queue in self._queues.values():
+                queue.clear()
             
             # Schedule data collection every 20 minutes between 10:00 AM and 2:30 PM
             start_time = self.config.MONITORING_START_TIME
             end_time = self.config.MONITORING_END_TIME
+            interval = self.config.SCRAPING_INTERVAL_MINUTES
             
-            logger.info(f"⏰ Setting up schedule: {start_time} to {end_time} every {self.config.SCRAPING_INTERVAL_MINUTES} minutes")
+            logger.info(f"⏰ Setting up schedule: {start_time} to {end_time} every {interval} minutes")
             
-            # Create time slots for data collection
-            current_time = datetime.combine(datetime.today(), start_time)
-            end_datetime = datetime.combine(datetime.today(), end_time)
+            # Create time slots for data collection, in minutes since midnight
+            start_minute = start_time.hour * 60 + start_time.minute
+            end_minute = end_time.hour * 60 + end_time.minute
             
-            while current_time <= end_datetime:
-                time_str = current_time.strftime('%H:%M')
-                
-                # Schedule the job for this time
-                schedule.every().day.at(time_str).do(self._collect_data_job)
-                logger.debug(f"📅 Scheduled data collection at {time_str}")
-                
-                # Move to next interval
-                current_time = current_time.replace(
-                    minute=(current_time.minute // self.config.SCRAPING_INTERVAL_MINUTES + 1) * self.config.SCRAPING_INTERVAL_MINUTES
-                )
-                
-                # Handle hour overflow
-                if current_time.minute >= 60:
-                    current_time = current_time.replace(
-                        hour=current_time.hour + current_time.minute // 60,
-                        minute=current_time.minute % 60
-                    )
+            for minute in range(start_minute, end_minute + 1, interval):
+                self._add_daily_job('collect', dt_time(minute // 60, minute % 60), self._collect_data_job)
+                logger.debug(f"📅 Scheduled data collection at {minute // 60:02d}:{minute % 60:02d}")
             
             # Schedule daily cleanup at market close
-            schedule.every().day.at("15:00").do(self._daily_cleanup_job)
-            schedule.every().day.at("00:01").do(self._reset_daily_data_job)
+            self._add_daily_job('daily', dt_time(15, 0), self._daily_cleanup_job)
+            self._add_daily_job('daily', dt_time(0, 1), self._reset_daily_data_job)
             
             # Schedule periodic maintenance
-            schedule.every().hour.do(self._maintenance_job)
+            self._add_job('maint', datetime.now() + timedelta(hours=1), timedelta(hours=1), self._maintenance_job)
+            # First keep-alive runs on the first scheduler tick, warming the connection off the startup path
+            self._add_job('maint', datetime.now(), timedelta(minutes=10), self._keepalive_job)
             
-            logger.info(f"✅ Scheduled {len(schedule.jobs)} total jobs")
+            self._update_next_run_time()
+            logger.info(f"✅ Scheduled {self._job_count()} total jobs")
             
         except Exception as e:
             logger.error(f"❌ Error setting up schedule: {e}")
     
+    def _add_daily_job(self, kind: str, at: dt_time, func: Callable[[], None]):
+        """Schedule func every day at the given wall-clock time"""
+        next_run = datetime.combine(datetime.today(), at)
+        if next_run <= datetime.now():
+            next_run += timedelta(days=1)
+        self._add_job(kind, next_run, timedelta(days=1), func)
+    
+    def _add_job(self, kind: str, next_run: datetime, interval: timedelta, func: Callable[[], None]):
+        """Insert a job into its queue, keeping the queue sorted by next run"""
+        bisect.insort(self._queues[kind], (next_run, next(self._job_counter), ScheduledJob(func, interval)))
+    
+    def _next_queue(self) -> Optional[Deque[Tuple[datetime, int, ScheduledJob]]]:
+        """The queue whose head job is due first (None when nothing is scheduled)"""
+        return min((queue for queue in self._queues.values() if queue), key=lambda queue: queue[0], default=None)
+    
+    def _job_count(self) -> int:
+        """Total number of scheduled jobs"""
+        return sum(len(queue) for queue in self._queues.values())
+    
     def _collect_data_job(self):
         """Job function for data collection"""
         try:
-            logger.info("🔄 Starting scheduled data collection...")
-            self.last_run_time = datetime.now()
-            
-            # Check if we're in market hours
-            current_time = datetime.now().time()
-            if not (self.config.MONITORING_START_TIME <= current_time <= self.config.MONITORING_END_TIME):
+            # Check if we're in market hours before doing any work
+            now = datetime.now()
+            if not (self.config.MONITORING_START_TIME <= now.time() <= self.config.MONITORING_END_TIME):
                 logger.info("⏰ Outside market hours, skipping data collection")
                 return
             
+            logger.info("🔄 Starting scheduled data collection...")
+            self.last_run_time = now
+            self._last_run_iso = now.isoformat()
+            
             # Scrape data from NSE
             scrape_result = self.scraper.scrape_oi_spurts_data()
             
@@ -159,32 +194,76 @@ class DataScheduler:
         except Exception as e:
             logger.error(f"❌ Error in maintenance job: {e}")
     
-    def _update_next_run_time(self):
-        """Update the next scheduled run time"""
+    def _keepalive_job(self):
+        """Job function keeping the NSE connection warm around market hours"""
         try:
+            # From one keep-alive interval before the first slot until the last one
             now = datetime.now()
-            upcoming_jobs = []
-            
-            for job in schedule.jobs:
-                if hasattr(job, 'next_run'):
-                    upcoming_jobs.append(job.next_run)
-            
-            if upcoming_jobs:
-                self.next_run_time = min(upcoming_jobs)
-            else:
-                self.next_run_time = None
-                
+            minute = now.hour * 60 + now.minute
+            start = self.config.MONITORING_START_TIME
+            end = self.config.MONITORING_END_TIME
+            if not self._is_trading_day(now.date()):
+                return
+            if start.hour * 60 + start.minute - 10 <= minute <= end.hour * 60 + end.minute:
+                self.scraper.warm_up()
         except Exception as e:
-            logger.debug(f"Error updating next run time: {e}")
-            self.next_run_time = None
+            logger.error(f"❌ Error in keep-alive job: {e}")
+    
+    def _is_trading_day(self, day: date) -> bool:
+        """Whether NSE is open on the given day (weekdays that are not holidays)"""
+        if day.year != self._holidays_year:
+            self._holidays_year = day.year
+            self._holidays = self.config.load_nse_holidays(day.year)
+        return day.weekday() < 5 and day not in self._holidays
+    
+    def _update_next_run_time(self):
+        """Update the next scheduled run time"""
+        queue = self._next_queue()
+        self.next_run_time = queue[0][0] if queue else None
     
     def run_pending(self):
         """Run pending scheduled jobs"""
         try:
-            schedule.run_pending()
+            now = datetime.now()
+            
+            # Collect every job that came due since the last wake-up (e.g. several
+            # collection slots after a suspend), then run each function only once
+            to_fire = {}
+            queue = self._next_queue()
+            while queue and queue[0][0] <= now:
+                next_run, _, job = queue.popleft()
+                kind = next(kind for kind, q in self._queues.items() if q is queue)
+                to_fire[job.func] = kind
+                
+                # Reschedule before running; skip any runs missed while we were busy or asleep
+                while next_run <= now:
+                    next_run += job.interval
+                bisect.insort(queue, (next_run, next(self._job_counter), job))
+                queue = self._next_queue()
+            
+            # Collection and market-close cleanup only run on trading days
+            trading_day = self._is_trading_day(now.date())
+            for func, kind in to_fire.items():
+                if trading_day or kind not in self._TRADING_DAY_KINDS:
+                    func()
+            
+            self._update_next_run_time()
         except Exception as e:
             logger.error(f"❌ Error running pending jobs: {e}")
     
+    def seconds_until_next_job(self, max_wait: float = 3600) -> float:
+        """How long until the next job is due (at most max_wait)"""
+        queue = self._next_queue()
+        if not queue:  # No jobs scheduled
+            return max_wait
+        idle = (queue[0][0] - datetime.now()).total_seconds()
+        return min(max(idle, 0), max_wait)
+    
+    def wait_for_next_job(self):
+        """Block until the next job is due, or until stop() is called"""
+        self._wake.wait(timeout=self.seconds_until_next_job())
+        self._wake.clear()
+    
     def start(self):
         """Start the scheduler in a separate thread"""
         self.running = True
@@ -192,37 +271,52 @@ class DataScheduler:
         scheduler_thread.start()
         logger.info("🚀 Scheduler started")
     
+    def store_pending_downloads(self):
+        """Store files downloaded before a restart but never processed; run once when the scheduler starts"""
+        try:
+            stored = self.processor.process_unstored_files()
+            if stored:
+                logger.info(f"✅ Stored {stored} previously downloaded files")
+        except Exception as e:
+            logger.error(f"❌ Error storing pending downloads: {e}")
+    
     def _run_scheduler(self):
         """Main scheduler loop"""
         try:
+            self.store_pending_downloads()
             while self.running:
                 self.run_pending()
-                time.sleep(60)  # Check every minute
+                self.wait_for_next_job()
         except Exception as e:
             logger.error(f"❌ Scheduler error: {e}")
     
     def stop(self):
         """Stop the scheduler"""
         self.running = False
-        schedule.clear()
+        for queue in self._queues.values():
+            queue.clear()
+        self._update_next_run_time()
+        self._wake.set()
         logger.info("🛑 Scheduler stopped")
     
     def get_schedule_info(self) -> dict:
         """Get information about scheduled jobs"""
         try:
             jobs_info = []
-            for job in schedule.jobs:
-                jobs_info.append({
-                    'function': str(job.job_func),
-                    'next_run': job.next_run.isoformat() if hasattr(job, 'next_run') and job.next_run else None,
-                    'interval': str(job.interval) if hasattr(job, 'interval') else None,
-                    'unit': str(job.unit) if hasattr(job, 'unit') else None
-                })
+            for kind, queue in self._queues.items():
+                for next_run, _, job in queue:
+                    jobs_info.append({
+                        'kind': kind,
+                        'function': job.func.__name__,
+                        'next_run': next_run.isoformat(),
+                        'interval': str(int(job.interval.total_seconds())),
+                        'unit': 'seconds'
+                    })
             
             return {
-                'total_jobs': len(schedule.jobs),
+                'total_jobs': self._job_count(),
                 'jobs': jobs_info,
-                'last_run': self.last_run_time.isoformat() if self.last_run_time else None,
+                'last_run': self._last_run_iso,
                 'next_run': self.next_run_time.isoformat() if self.next_run_time else None,
                 'running': self.running
             }
@@ -4,28 +4,143 @@ Handles downloading and parsing of NSE India Oi spurts data
 """
 
 import asyncio
+import importlib.util
 import logging
 import os
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, date
-import time
-import json
 from typing import Dict, List, Optional, Tuple
 import re
-from urllib.parse import urljoin
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote, urljoin
 
 from config import Config
 
+try:
+    import hyperscan
+except ImportError:  # Optional: the precompiled regexes are used on their own
+    hyperscan = None
+
 logger = logging.getLogger(__name__)
 
+# HTTP/2 lets concurrent probes share one connection to nseindia.com; httpx needs h2 for it
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+# Leading bytes of .xlsx (ZIP) and legacy .xls (OLE2) files
+SPREADSHEET_MAGIC = (b'PK\x03\x04', b'\xd0\xcf\x11\xe0')
+
+# Content types that indicate a downloadable spreadsheet rather than an HTML page
+DOWNLOAD_CONTENT_TYPES = ('application/vnd', 'application/octet')
+
+# Common patterns for NSE download links, in priority order
+_DOWNLOAD_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'href="([^"]*oi[_-]?spurts[^"]*\.xlsx?)"',  # Direct Excel links
+    r'href="([^"]*download[^"]*oi[^"]*)"',  # Download links containing 'oi'
+    r'"downloadUrl":"([^"]*)"',  # JSON download URL
+    r'data-url="([^"]*oi[^"]*)"',  # Data URL attributes
+    r'action="([^"]*download[^"]*)"'  # Form actions
+)]
+
+# Patterns for API endpoints, tried when no direct download link is found
+_API_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'"apiUrl":"([^"]*oi[^"]*)"',
+    r'api/([^"]*oi[^"]*)',
+    r'data-api="([^"]*)"'
+)]
+
+def _build_pattern_database():
+    """Compile all URL patterns into one Hyperscan database (None when unavailable)"""
+    if hyperscan is None:
+        return None
+    try:
+        patterns = _DOWNLOAD_PATTERNS + _API_PATTERNS
+        database = hyperscan.Database()
+        database.compile(
+            expressions=[pattern.pattern.encode() for pattern in patterns],
+            ids=list(range(len(patterns))),
+            elements=len(patterns),
+            flags=[hyperscan.HS_FLAG_CASELESS] * len(patterns)
+        )
+        return database
+    except Exception as e:
+        logger.warning(f"⚠️  Could not compile Hyperscan database, using regex scan: {e}")
+        return None
+
+_PATTERN_DATABASE = _build_pattern_database()
+
+# A lowercase literal every match of the pattern must contain, in pattern order
+_PATTERN_LITERALS = (
+    b'spurts', b'download', b'"downloadurl":"', b'data-url="', b'action="',  # _DOWNLOAD_PATTERNS
+    b'"apiurl":"', b'api/', b'data-api="'  # _API_PATTERNS
+)
+
+def _patterns_present(html_content: str) -> set:
+    """
+    Find which URL patterns can occur in the page
+    Uses a single Hyperscan pass when available, otherwise a substring
+    prefilter on each pattern's literal (patterns without it cannot match)
+    """
+    patterns = _DOWNLOAD_PATTERNS + _API_PATTERNS
+    
+    if _PATTERN_DATABASE is None:
+        html_bytes = html_content.lower().encode('latin-1', errors='ignore')
+        return {pattern for pattern, literal in zip(patterns, _PATTERN_LITERALS) if html_bytes.find(literal) >= 0}
+    
+    present = set()
+    
+    def on_match(pattern_id, start, end, flags, context):
+        present.add(patterns[pattern_id])
+    
+    _PATTERN_DATABASE.scan(html_content.encode('utf-8', errors='ignore'), match_event_handler=on_match)
+    return present
+
+class _NSEAdapter(HTTPAdapter):
+    """HTTPAdapter whose retries can be switched off for requests made on the calling thread"""
+    
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        super().__init__(*args, **kwargs)
+    
+    @property
+    def max_retries(self):
+        if getattr(self._local, 'no_retries', False):
+            return Retry(0, read=False)
+        return self._max_retries
+    
+    @max_retries.setter
+    def max_retries(self, value):
+        self._max_retries = value
+    
+    @contextmanager
+    def retries_disabled(self):
+        """Send this thread's requests once, on the same pooled connections"""
+        self._local.no_retries = True
+        try:
+            yield
+        finally:
+            self._local.no_retries = False
+
 class NSEScraper:
     """Handles scraping of NSE OI Spurts data"""
     
     def __init__(self):
         self.config = Config()
+        self.config.ensure_directories()
+        # EXCEL_DIR with a trailing separator, joined once; file names are appended to it
+        self._excel_dir = os.path.join(self.config.EXCEL_DIR, '')
         self.session = requests.Session()
         self.setup_session()
         self.last_scrape_time = None
+        self._last_scrape_iso = None  # last_scrape_time, formatted once when set
+        # Download URL resolved from the NSE page, per day (it changes at most daily)
+        self._url_cache: Dict[date, str] = {}
+        # Number of data files in EXCEL_DIR, kept current by the save and cleanup paths
+        self._excel_file_count = self._count_data_files()
         
     def setup_session(self):
         """Setup requests session with proper headers"""
@@ -43,6 +158,30 @@ class NSEScraper:
             'Cache-Control': 'max-age=0'
         })
         
+        # Retries with exponential backoff (honouring Retry-After) happen inside
+        # urllib3, on the pooled keep-alive connection
+        retry = Retry(
+            total=self.config.MAX_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self._adapter = _NSEAdapter(max_retries=retry, pool_connections=4, pool_maxsize=8)
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+    
+    def warm_up(self):
+        """Open (or keep alive) the pooled connection to NSE so scrapes skip the TCP/TLS handshake"""
+        try:
+            # No retries: a warm-up is best effort and must not stall its caller
+            with self._adapter.retries_disabled():
+                self.session.head(self.config.NSE_BASE_URL, timeout=5).close()
+            logger.debug("🔌 NSE connection warmed up")
+        except Exception as e:
+            logger.debug(f"Connection warm-up failed: {e}")
+        
     def scrape_oi_spurts_data(self) -> Optional[Dict]:
         """
         Scrape Oi spurts data from NSE website
@@ -51,34 +190,39 @@ class NSEScraper:
         try:
             logger.info("🔍 Starting OI spurts data scraping...")
             
-            # First, get the main page to establish session
-            main_response = self._make_request(self.config.NSE_OI_SPURTS_URL)
-            if not main_response:
-                return None
-            
-            # Look for the download link or API endpoint
-            download_url = self._find_download_url(main_response.text)
-            if not download_url:
-                logger.error("❌ Could not find download URL for OI spurts data")
-                return None
-            
-            # Download the Excel file
-            excel_data = self._download_excel_file(download_url)
-            if not excel_data:
-                return None
+            # Reuse today's download URL while it still works (session cookies included)
+            today = date.today()
+            download_url = self._url_cache.get(today)
+            file_path = self._download_to_file(download_url) if download_url else None
             
-            # Save the Excel file
-            file_path = self._save_excel_file(excel_data)
             if not file_path:
-                return None
+                # First, get the main page to establish session
+                main_response = self._make_request(self.config.NSE_OI_SPURTS_URL)
+                if not main_response:
+                    return None
+                
+                # Look for the download link or API endpoint
+                download_url = self._find_download_url(main_response.text)
+                if not download_url:
+                    logger.error("❌ Could not find download URL for OI spurts data")
+                    return None
+                
+                # Only today's entry is kept
+                self._url_cache = {today: download_url}
+                
+                # Download the Excel file straight to disk
+                file_path = self._download_to_file(download_url)
+                if not file_path:
+                    return None
             
             self.last_scrape_time = datetime.now()
+            self._last_scrape_iso = self.last_scrape_time.isoformat()
             
             return {
                 'success': True,
                 'file_path': file_path,
-                'timestamp': self.last_scrape_time.isoformat(),
-                'size': len(excel_data),
+                'timestamp': self._last_scrape_iso,
+                'size': os.path.getsize(file_path),
                 'url': download_url
             }
             
@@ -86,36 +230,25 @@ class NSEScraper:
             logger.error(f"❌ Error scraping OI spurts data: {e}")
             return None
     
-    def _make_request(self, url: str, retries: int = None) -> Optional[requests.Response]:
-        """Make HTTP request with retry logic"""
-        if retries is None:
-            retries = self.config.MAX_RETRIES
+    def _make_request(self, url: str) -> Optional[requests.Response]:
+        """Make HTTP request (retries are handled by the session's adapter)"""
+        try:
+            logger.debug(f"Making request to {url}")
+            
+            response = self.session.get(
+                url,
+                timeout=self.config.REQUEST_TIMEOUT,
+                allow_redirects=True
+            )
+            
+            if response.status_code == 200:
+                return response
+            
+            logger.warning(f"⚠️  HTTP {response.status_code} for {url}")
+            
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"⚠️  Request failed: {e}")
             
-        for attempt in range(retries + 1):
-            try:
-                logger.debug(f"Making request to {url} (attempt {attempt + 1})")
-                
-                response = self.session.get(
-                    url,
-                    timeout=self.config.REQUEST_TIMEOUT,
-                    allow_redirects=True
-                )
-                
-                if response.status_code == 200:
-                    return response
-                elif response.status_code == 429:  # Rate limited
-                    wait_time = 2 ** attempt  # Exponential backoff
-                    logger.warning(f"⏱️  Rate limited, waiting {wait_time}s...")
-                    time.sleep(wait_time)
-                else:
-                    logger.warning(f"⚠️  HTTP {response.status_code} for {url}")
-                    
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"⚠️  Request failed (attempt {attempt + 1}): {e}")
-                
-                if attempt < retries:
-                    time.sleep(self.config.RETRY_DELAY)
-                    
         logger.error(f"❌ All request attempts failed for {url}")
         return None
     
@@ -125,19 +258,16 @@ class NSEScraper:
         NSE typically provides download links in specific patterns
         """
         try:
-            # Common patterns for NSE download links
-            patterns = [
-                r'href="([^"]*oi[_-]?spurts[^"]*\.xlsx?)"',  # Direct Excel links
-                r'href="([^"]*download[^"]*oi[^"]*)"',  # Download links containing 'oi'
-                r'"downloadUrl":"([^"]*)"',  # JSON download URL
-                r'data-url="([^"]*oi[^"]*)"',  # Data URL attributes
-                r'action="([^"]*download[^"]*)"'  # Form actions
-            ]
-            
-            for pattern in patterns:
-                matches = re.findall(pattern, html_content, re.IGNORECASE)
-                if matches:
-                    url = matches[0]
+            # A cheap prescan tells us which regexes are worth running
+            present = _patterns_present(html_content)
+            
+            # Only the first match of each pattern is used
+            for pattern in _DOWNLOAD_PATTERNS:
+                if pattern not in present:
+                    continue
+                match = pattern.search(html_content)
+                if match:
+                    url = match.group(1)
                     # Convert relative URLs to absolute
                     if url.startswith('/'):
                         url = urljoin(self.config.NSE_BASE_URL, url)
@@ -148,16 +278,12 @@ class NSEScraper:
                     return url
             
             # If no direct links found, try to find API endpoints
-            api_patterns = [
-                r'"apiUrl":"([^"]*oi[^"]*)"',
-                r'api/([^"]*oi[^"]*)',
-                r'data-api="([^"]*)"'
-            ]
-            
-            for pattern in api_patterns:
-                matches = re.findall(pattern, html_content, re.IGNORECASE)
-                if matches:
-                    url = matches[0]
+            for pattern in _API_PATTERNS:
+                if pattern not in present:
+                    continue
+                match = pattern.search(html_content)
+                if match:
+                    url = match.group(1)
                     if url.startswith('/'):
                         url = urljoin(self.config.NSE_BASE_URL, url)
                     
@@ -169,17 +295,18 @@ class NSEScraper:
                 '/api/equity-stockIndices?csv=true',
                 '/api/option-chain-indices?symbol=NIFTY',
                 '/content/indices/ind_niftyoptions.csv',
-                '/api/reports?archives=[{%22name%22:%22F&O%20-%20OI%20Spurts%22,%22type%22:%22archives%22,%22category%22:%22derivatives%22,%22section%22:%22equity%22}]'
+                '/api/reports?archives=' + quote(
+                    '[{"name":"F&O - OI Spurts","type":"archives","category":"derivatives","section":"equity"}]',
+                    safe=''
+                )
             ]
             
-            for endpoint in common_endpoints:
-                test_url = urljoin(self.config.NSE_BASE_URL, endpoint)
-                logger.debug(f"Testing endpoint: {test_url}")
-                
-                test_response = self._make_request(test_url, retries=1)
-                if test_response and test_response.headers.get('content-type', '').startswith(('application/vnd', 'application/octet')):
-                    logger.info(f"✅ Found working endpoint: {test_url}")
-                    return test_url
+            # Probe them concurrently; the first one serving a spreadsheet wins
+            test_urls = [urljoin(self.config.NSE_BASE_URL, endpoint) for endpoint in common_endpoints]
+            test_url = asyncio.run(self._probe_endpoints(test_urls))
+            if test_url:
+                logger.info(f"✅ Found working endpoint: {test_url}")
+                return test_url
             
             logger.warning("⚠️  No download URL found, will try fallback method")
             return None
@@ -188,8 +315,87 @@ class NSEScraper:
             logger.error(f"❌ Error finding download URL: {e}")
             return None
     
-    def _download_excel_file(self, url: str) -> Optional[bytes]:
-        """Download Excel file from URL"""
+    def _async_client(self) -> httpx.AsyncClient:
+        """Async HTTP client sharing the session's headers and NSE cookies"""
+        # brotli is not a dependency, so httpx could not decode a 'br' response
+        headers = {**self.session.headers, 'Accept-Encoding': 'gzip, deflate'}
+        # Connection failures are retried by the transport; the session's adapter does the same for sync requests
+        transport = httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, retries=self.config.MAX_RETRIES)
+        return httpx.AsyncClient(
+            transport=transport,
+            headers=headers,
+            cookies=self.session.cookies,
+            timeout=self.config.REQUEST_TIMEOUT,
+            follow_redirects=True
+        )
+    
+    async def _probe_endpoints(self, candidates: List[str]) -> Optional[str]:
+        """Request all candidate URLs at once and return the first that serves a spreadsheet"""
+        async with self._async_client() as client:
+            async def probe(url: str) -> Tuple[str, httpx.Response]:
+                logger.debug(f"Testing endpoint: {url}")
+                # Only the status and headers are needed: HEAD, or a GET closed before the body
+                response = await client.head(url)
+                if response.status_code in (405, 501):  # HEAD not allowed
+                    response = await client.send(client.build_request('GET', url), stream=True)
+                    await response.aclose()
+                return url, response
+            
+            tasks = [asyncio.create_task(probe(url)) for url in candidates]
+            try:
+                for future in asyncio.as_completed(tasks):
+                    try:
+                        url, response = await future
+                    except Exception as e:  # Not only httpx.HTTPError: e.g. httpx.InvalidURL
+                        logger.debug(f"Endpoint probe failed: {e}")
+                        continue
+                    
+                    if response.status_code == 200 and response.headers.get('content-type', '').startswith(DOWNLOAD_CONTENT_TYPES):
+                        return url
+                return None
+            finally:
+                # Stop the slower probes once a winner is found
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def _first_fallback(self, urls: List[str]) -> Optional[Dict]:
+        """Fetch fallback URLs concurrently; the first usable response wins"""
+        async with self._async_client() as client:
+            # One attempt per URL: the fallbacks already race each other, and
+            # connection retries happen in the client's transport
+            async def fetch(url: str) -> Tuple[str, Optional[httpx.Response]]:
+                try:
+                    response = await client.get(url)
+                    if response.status_code == 200:
+                        return url, response
+                    logger.warning(f"⚠️  HTTP {response.status_code} for {url}")
+                except Exception as e:  # One failing URL must not end the race
+                    logger.warning(f"⚠️  Request failed for {url}: {e}")
+                return url, None
+            
+            tasks = [asyncio.create_task(fetch(url)) for url in urls]
+            try:
+                for future in asyncio.as_completed(tasks):
+                    url, response = await future
+                    result = self._materialize_fallback(response, url) if response else None
+                    if result:
+                        return result
+                return None
+            finally:
+                # A slow fallback no longer matters once one has succeeded
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _new_file_path(self, prefix: str, extension: str, now: datetime) -> str:
+        """Path in EXCEL_DIR for a data file saved at `now`"""
+        return f"{self._excel_dir}{prefix}_{now:%Y%m%d_%H%M%S}{extension}"
+    
+    def _download_to_file(self, url: str) -> Optional[str]:
+        """Stream an Excel file from URL to disk; returns the saved path"""
+        file_path = self._new_file_path('oi_spurts', '.xlsx', datetime.now())
+        
         try:
             logger.info(f"⬇️  Downloading Excel file from: {url}")
             
@@ -202,59 +408,52 @@ class NSEScraper:
                 'Sec-Fetch-Site': 'same-origin'
             })
             
-            response = self.session.get(
+            with self.session.get(
                 url,
                 headers=download_headers,
                 timeout=self.config.REQUEST_TIMEOUT * 2,  # Longer timeout for file download
                 stream=True
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"❌ Download failed with status {response.status_code}")
-                return None
-            
-            # Check if response is actually an Excel file
-            content_type = response.headers.get('content-type', '').lower()
-            if not (content_type.startswith('application/vnd') or 
-                    content_type.startswith('application/octet') or
-                    content_type.startswith('application/excel')):
-                logger.warning(f"⚠️  Unexpected content type: {content_type}")
-                
-                # Check if it's HTML (error page)
-                content_preview = response.content[:1000].decode('utf-8', errors='ignore')
-                if '<html' in content_preview.lower():
-                    logger.error("❌ Received HTML instead of Excel file")
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"❌ Download failed with status {response.status_code}")
                     return None
+                
+                chunks = response.iter_content(chunk_size=64 * 1024)
+                first_chunk = next(chunks, b'')
+                
+                # Check if response is actually an Excel file; a spreadsheet
+                # signature settles it without looking at the content type
+                content_type = response.headers.get('content-type', '').lower()
+                if not first_chunk.startswith(SPREADSHEET_MAGIC) and not (
+                        content_type.startswith('application/vnd') or 
+                        content_type.startswith('application/octet') or
+                        content_type.startswith('application/excel')):
+                    logger.warning(f"⚠️  Unexpected content type: {content_type}")
+                    
+                    # Check if it's HTML (error page); CSV bodies are still accepted
+                    if b'<html' in first_chunk[:1000].lower():
+                        logger.error("❌ Received HTML instead of Excel file")
+                        return None
+                
+                with open(file_path, 'wb') as f:
+                    f.write(first_chunk)
+                    for chunk in chunks:
+                        f.write(chunk)
             
-            content = response.content
-            file_size = len(content)
-            
+            file_size = os.path.getsize(file_path)
             if file_size < 1000:  # Suspiciously small Excel file
                 logger.warning(f"⚠️  Excel file seems too small ({file_size} bytes)")
+                os.remove(file_path)
                 return None
             
-            logger.info(f"✅ Successfully downloaded Excel file ({file_size:,} bytes)")
-            return content
-            
-        except Exception as e:
-            logger.error(f"❌ Error downloading Excel file: {e}")
-            return None
-    
-    def _save_excel_file(self, excel_data: bytes) -> Optional[str]:
-        """Save Excel file to disk"""
-        try:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"oi_spurts_{timestamp}.xlsx"
-            file_path = os.path.join(self.config.EXCEL_DIR, filename)
-            
-            with open(file_path, 'wb') as f:
-                f.write(excel_data)
-            
-            logger.info(f"💾 Saved Excel file: {file_path}")
+            self._excel_file_count += 1
+            logger.info(f"✅ Downloaded Excel file ({file_size:,} bytes) to {file_path}")
             return file_path
             
         except Exception as e:
-            logger.error(f"❌ Error saving Excel file: {e}")
+            logger.error(f"❌ Error downloading Excel file: {e}")
+            if os.path.exists(file_path):
+                os.remove(file_path)
             return None
     
     def get_fallback_data(self) -> Optional[Dict]:
@@ -272,30 +471,11 @@ class NSEScraper:
                 "https://www.nseindia.com/api/chart-databyindex?index=OPTIDXNIFTY",
             ]
             
-            for url in fallback_urls:
-                logger.info(f"Trying fallback URL: {url}")
-                response = self._make_request(url)
-                
-                if response:
-                    # Try to process as JSON first
-                    try:
-                        data = response.json()
-                        if data and isinstance(data, dict):
-                            # Convert to our format
-                            return self._process_fallback_json(data, url)
-                    except:
-                        # Try to process as CSV/Excel
-                        if len(response.content) > 1000:
-                            file_path = self._save_fallback_file(response.content, url)
-                            if file_path:
-                                return {
-                                    'success': True,
-                                    'file_path': file_path,
-                                    'timestamp': datetime.now().isoformat(),
-                                    'size': len(response.content),
-                                    'url': url,
-                                    'source': 'fallback'
-                                }
+            # Race all fallbacks; whichever returns usable data first is used
+            logger.info(f"Trying {len(fallback_urls)} fallback URLs")
+            result = asyncio.run(self._first_fallback(fallback_urls))
+            if result:
+                return result
             
             logger.error("❌ All fallback methods failed")
             return None
@@ -304,12 +484,37 @@ class NSEScraper:
             logger.error(f"❌ Error in fallback data collection: {e}")
             return None
     
+    def _materialize_fallback(self, response: httpx.Response, url: str) -> Optional[Dict]:
+        """Save a fallback response as a data file; None if it is not usable"""
+        # Sniff the body before parsing: JSON APIs start with an object or array
+        if response.content[:1] in (b'{', b'['):
+            try:
+                data = orjson.loads(response.content)
+                if data and isinstance(data, dict):
+                    # Convert to our format
+                    return self._process_fallback_json(data, url)
+                return None
+            except orjson.JSONDecodeError:
+                pass
+        
+        # Try to process as CSV/Excel
+        if len(response.content) > 1000:
+            now = datetime.now()
+            file_path = self._save_fallback_file(response.content, url, now)
+            if file_path:
+                return {
+                    'success': True,
+                    'file_path': file_path,
+                    'timestamp': now.isoformat(),
+                    'size': len(response.content),
+                    'url': url,
+                    'source': 'fallback'
+                }
+        return None
+    
     def _process_fallback_json(self, data: Dict, source_url: str) -> Optional[Dict]:
         """Process JSON data from fallback APIs"""
         try:
-            # Create a mock Excel file from JSON data
-            import pandas as pd
-            
             # Extract relevant data based on API structure
             if 'records' in data and 'data' in data['records']:
                 df_data = data['records']['data']
@@ -318,20 +523,18 @@ class NSEScraper:
             else:
                 df_data = [data]
             
-            # Create DataFrame
-            df = pd.DataFrame(df_data)
-            
-            # Save as Excel
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"oi_spurts_fallback_{timestamp}.xlsx"
-            file_path = os.path.join(self.config.EXCEL_DIR, filename)
+            # Save the records as JSON; DataProcessor reads .json files directly
+            now = datetime.now()
+            file_path = self._new_file_path('oi_spurts_fallback', '.json', now)
             
-            df.to_excel(file_path, index=False)
+            with open(file_path, 'wb') as f:
+                f.write(orjson.dumps(df_data))
+            self._excel_file_count += 1
             
             return {
                 'success': True,
                 'file_path': file_path,
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': now.isoformat(),
                 'size': os.path.getsize(file_path),
                 'url': source_url,
                 'source': 'fallback_json'
@@ -341,22 +544,20 @@ class NSEScraper:
             logger.error(f"❌ Error processing fallback JSON: {e}")
             return None
     
-    def _save_fallback_file(self, content: bytes, source_url: str) -> Optional[str]:
+    def _save_fallback_file(self, content: bytes, source_url: str, now: datetime) -> Optional[str]:
         """Save fallback content as file"""
         try:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            
             # Determine file extension
             if source_url.endswith('.csv') or 'csv' in source_url:
                 extension = '.csv'
             else:
                 extension = '.xlsx'
             
-            filename = f"oi_spurts_fallback_{timestamp}{extension}"
-            file_path = os.path.join(self.config.EXCEL_DIR, filename)
+            file_path = self._new_file_path('oi_spurts_fallback', extension, now)
             
             with open(file_path, 'wb') as f:
                 f.write(content)
+            self._excel_file_count += 1
             
             logger.info(f"💾 Saved fallback file: {file_path}")
             return file_path
@@ -371,12 +572,15 @@ class NSEScraper:
             if max_files is None:
                 max_files = self.config.MAX_DAILY_FILES
             
-            excel_files = []
-            for filename in os.listdir(self.config.EXCEL_DIR):
-                if filename.endswith(('.xlsx', '.xls', '.csv')):
-                    file_path = os.path.join(self.config.EXCEL_DIR, filename)
-                    stat = os.stat(file_path)
-                    excel_files.append((file_path, stat.st_mtime))
+            with os.scandir(self.config.EXCEL_DIR) as it:
+                excel_files = [
+                    (file_entry.path, file_entry.stat().st_mtime)
+                    for file_entry in it
+                    if file_entry.name.endswith(self.config.DATA_FILE_EXTENSIONS) and file_entry.is_file()
+                ]
+            
+            # Resync the maintained count with the directory we just scanned
+            self._excel_file_count = len(excel_files)
             
             # Sort by modification time (newest first)
             excel_files.sort(key=lambda x: x[1], reverse=True)
@@ -387,6 +591,7 @@ class NSEScraper:
                 for file_path, _ in files_to_remove:
                     try:
                         os.remove(file_path)
+                        self._excel_file_count -= 1
                         logger.info(f"🗑️  Removed old file: {os.path.basename(file_path)}")
                     except Exception as e:
                         logger.error(f"❌ Error removing file {file_path}: {e}")
@@ -394,12 +599,16 @@ class NSEScraper:
         except Exception as e:
             logger.error(f"❌ Error during cleanup: {e}")
     
+    def _count_data_files(self) -> int:
+        """Count data files in EXCEL_DIR with one directory scan"""
+        with os.scandir(self.config.EXCEL_DIR) as it:
+            return sum(1 for file_entry in it if file_entry.name.endswith(self.config.DATA_FILE_EXTENSIONS))
+    
     def get_scraping_status(self) -> Dict:
         """Get current scraping status"""
         return {
-            'last_scrape_time': self.last_scrape_time.isoformat() if self.last_scrape_time else None,
-            'excel_files_count': len([f for f in os.listdir(self.config.EXCEL_DIR) 
-                                     if f.endswith(('.xlsx', '.xls', '.csv'))]),
+            'last_scrape_time': self._last_scrape_iso,
+            'excel_files_count': self._excel_file_count,
             'session_active': bool(self.session.cookies),
             'config_url': self.config.NSE_OI_SPURTS_URL
         }
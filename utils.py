@@ -1,16 +1,51 @@
 """
 Utility functions for NSE Oi Spurts Bot
 Common helper functions and formatting utilities
+
+These helpers are string/regex/datetime bound; do not JIT-compile them with
+Numba (object mode is slower here and regex is unsupported in nopython mode).
 """
 
 import re
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-import html
+from enum import StrEnum
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, List, Optional, Union
+
+try:
+    import re2 as _re_engine  # Linear-time DFA matching, same compile/sub/match API
+except ImportError:  # Optional: the standard library engine is used on its own
+    _re_engine = re
 
 logger = logging.getLogger(__name__)
 
+# Series suffixes stripped from stock names (all three characters long)
+_SUFFIXES = ('-EQ', '-BE', '-SM', '-ST', '.EQ', '.BE', '.SM', '.ST')
+
+# Patterns used by the per-stock helpers, compiled once
+_NON_WORD_RE = _re_engine.compile(r'[^\w\-_]')
+_WS_RE = _re_engine.compile(r'\s+')
+_VALID_NAME_RE = _re_engine.compile(r'^[A-Z0-9\-_&]+$')
+_FN_BAD_RE = _re_engine.compile(r'[<>:"/\\|?*]')
+
+# Translation table deleting control characters (code points below 32)
+_CTRL_DEL = dict.fromkeys(range(32))
+
+# (epoch second, 'HH:MM:SS') of the last formatted wall-clock time
+_ts_cache = (0, '')
+
+def _now_hms() -> str:
+    """Current local time as HH:MM:SS, formatted at most once per second"""
+    global _ts_cache
+    now = int(time.time())
+    if _ts_cache[0] != now:
+        _ts_cache = (now, time.strftime('%H:%M:%S', time.localtime(now)))
+    return _ts_cache[1]
+
+@lru_cache(maxsize=4096)  # Names come from a small universe of NSE symbols
 def normalize_stock_name(name: str) -> str:
     """
     Normalize stock name for consistent storage and comparison
@@ -21,21 +56,39 @@ def normalize_stock_name(name: str) -> str:
     # Convert to uppercase and strip whitespace
     normalized = str(name).upper().strip()
     
-    # Remove common suffixes and prefixes
-    suffixes_to_remove = ['-EQ', '-BE', '-SM', '-ST', '.EQ', '.BE', '.SM', '.ST']
-    for suffix in suffixes_to_remove:
-        if normalized.endswith(suffix):
-            normalized = normalized[:-len(suffix)]
-            break
+    # Remove common series suffixes (-EQ, .BE, ...) with one multi-suffix check
+    if normalized.endswith(_SUFFIXES):
+        normalized = normalized[:-3]
     
     # Remove special characters except hyphens and underscores
-    normalized = re.sub(r'[^\w\-_]', '', normalized)
+    normalized = _NON_WORD_RE.sub('', normalized)
     
     # Remove extra spaces and replace with single space
-    normalized = re.sub(r'\s+', ' ', normalized).strip()
+    normalized = _WS_RE.sub(' ', normalized).strip()
     
     return normalized
 
+# Prefix of the extra spreadsheet columns stored with each stock
+_ADDITIONAL_PREFIX = 'additional_'
+_ADDITIONAL_PREFIX_LEN = len(_ADDITIONAL_PREFIX)
+
+@lru_cache(maxsize=128)  # The same few column keys recur for every stock
+def _format_additional_field(key: str) -> str:
+    """Display title for an additional_* key, e.g. additional_last_price -> Last Price"""
+    return key[_ADDITIONAL_PREFIX_LEN:].replace('_', ' ').title()
+
+# Stock message body, already stripped; filled in by format_stock_data
+_STOCK_TEMPLATE = (
+    "📊 **Stock Data for {name}**\n"
+    "\n"
+    "🏷️ **Serial Number:** `{serial}` {emoji}\n"
+    "📈 **Position Change:** {change}\n"
+    "⏰ **Last Updated:** `{time}`\n"
+    "📅 **Date:** `{date}`\n"
+    "\n"
+    "💡 *Serial number indicates the stock's position in OI spurts ranking*"
+)
+
 def format_stock_data(stock_data: Dict) -> str:
     """
     Format stock data for Telegram display with proper markdown
@@ -73,46 +126,41 @@ def format_stock_data(stock_data: Dict) -> str:
             change_text = "(no change)"
         
         # Create formatted message
-        message = f"""
-📊 **Stock Data for {name}**
-
-🏷️ **Serial Number:** `{serial}` {change_emoji}
-📈 **Position Change:** {change_text}
-⏰ **Last Updated:** `{time_str}`
-📅 **Date:** `{date_str}`
-
-💡 *Serial number indicates the stock's position in OI spurts ranking*
-        """.strip()
-        
-        # Add additional data if available
-        additional_info = []
-        for key, value in stock_data.items():
-            if key.startswith('additional_') and value:
-                field_name = key.replace('additional_', '').replace('_', ' ').title()
-                additional_info.append(f"📋 **{field_name}:** `{value}`")
+        message = _STOCK_TEMPLATE.format(
+            name=name, serial=serial, emoji=change_emoji, change=change_text, time=time_str, date=date_str
+        )
         
-        if additional_info:
-            message += "\n\n**📊 Additional Data:**\n" + "\n".join(additional_info)
+        # Add additional data if available (most entries have none)
+        extras = [(key, value) for key, value in stock_data.items() if value and key.startswith(_ADDITIONAL_PREFIX)]
+        if not extras:
+            return message
         
-        return message
+        additional_info = [
+            f"📋 **{_format_additional_field(key)}:** `{value}`"
+            for key, value in extras
+        ]
+        return "\n".join([message, "\n**📊 Additional Data:**", *additional_info])
         
     except Exception as e:
         logger.error(f"❌ Error formatting stock data: {e}")
         return f"❌ **Error displaying data for {stock_data.get('name', 'Unknown Stock')}**"
 
-def format_error_message(title: str, error: str) -> str:
-    """
-    Format error message for Telegram display
-    """
-    try:
-        # Escape special characters for Markdown
-        escaped_error = html.escape(str(error))
-        
-        message = f"""
-❌ **{title}**
+class ErrorKind(StrEnum):
+    """Titles for the error messages shown to users"""
+    STATUS = "Status Check Failed"
+    QUERY = "Query Failed"
+    LIST = "List Stocks Failed"
+    HISTORY = "History Failed"
+    STOCK_QUERY = "Stock Query Failed"
+    BOT = "Bot Error"
+
+def _error_header(title: str) -> str:
+    """Build the title/details prefix of an error message"""
+    return f"❌ **{title}**\n\n🔍 **Error Details:**\n`"
 
-🔍 **Error Details:**
-`{escaped_error[:200]}{'...' if len(escaped_error) > 200 else ''}`
+# Fixed parts of the error message, built once; only the title, details and time vary
+_ERROR_HEADERS = {kind: _error_header(kind) for kind in ErrorKind}
+_ERROR_BODY = """`
 
 💡 **Possible Solutions:**
 • Try again in a few moments
@@ -120,36 +168,47 @@ def format_error_message(title: str, error: str) -> str:
 • Use /status to check bot health
 • Contact support if issue persists
 
-⏰ **Timestamp:** `{datetime.now().strftime('%H:%M:%S')}`
-        """.strip()
+⏰ **Timestamp:** `"""
+
+def format_error_message(title: Union[ErrorKind, str], error: str) -> str:
+    """
+    Format error message for Telegram display
+    """
+    try:
+        # Details sit in a Markdown code span, where only a backtick needs
+        # replacing; only the first 200 characters are shown
+        error_text = str(error)
         
-        return message
+        header = _ERROR_HEADERS.get(title) or _error_header(title)
+        shown = error_text[:200].replace('`', "'")
+        details = f"{shown}{'...' if len(error_text) > 200 else ''}"
+        
+        return f"{header}{details}{_ERROR_BODY}{_now_hms()}`"
         
     except Exception as e:
         logger.error(f"Error formatting error message: {e}")
         return f"❌ **{title}**\n\nAn error occurred. Please try again."
 
+# (unit, seconds per unit) for calculate_time_difference, largest first
+_TIME_UNITS = (('day', 86400), ('hour', 3600), ('minute', 60))
+_ONE_SECOND = timedelta(seconds=1)
+
 def calculate_time_difference(start_time: datetime, end_time: datetime) -> str:
     """
     Calculate and format time difference in human-readable format
     """
     try:
-        diff = end_time - start_time
-        
-        days = diff.days
-        hours, remainder = divmod(diff.seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
+        # Whole seconds, floored like timedelta's own days/seconds split
+        remainder = (end_time - start_time) // _ONE_SECOND
         
         parts = []
-        if days > 0:
-            parts.append(f"{days} day{'s' if days != 1 else ''}")
-        if hours > 0:
-            parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
-        if minutes > 0:
-            parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
+        for unit, unit_seconds in _TIME_UNITS:
+            count, remainder = divmod(remainder, unit_seconds)
+            if count > 0:
+                parts.append(f"{count} {unit}{'s' if count != 1 else ''}")
         
         if not parts:  # Less than a minute
-            parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
+            parts.append(f"{remainder} second{'s' if remainder != 1 else ''}")
         
         return ", ".join(parts)
         
@@ -165,46 +224,60 @@ def format_stock_list(stocks: List[Dict], page_size: int = 20) -> List[str]:
         if not stocks:
             return ["📭 **No stocks available**\n\nNo data has been collected today yet."]
         
-        # Sort stocks alphabetically
-        sorted_stocks = sorted(stocks, key=lambda x: x.get('name', ''))
+        # Sort stocks alphabetically (entries from get_all_stocks_today always have a name)
+        sorted_stocks = sorted(stocks, key=itemgetter('name'))
         
-        pages = []
-        for i in range(0, len(sorted_stocks), page_size):
-            page_stocks = sorted_stocks[i:i + page_size]
-            
-            stock_lines = []
-            for j, stock in enumerate(page_stocks, i + 1):
-                name = stock.get('name', 'Unknown')
-                serial = stock.get('serial_number', 'N/A')
-                change = stock.get('change', 0)
-                
-                change_indicator = ""
-                if change > 0:
-                    change_indicator = " ⬆️"
-                elif change < 0:
-                    change_indicator = " ⬇️"
-                
-                stock_lines.append(f"`{j:2d}.` **{name}** - Serial: `{serial}`{change_indicator}")
+        # Page count is computed once and shared by every page
+        total_pages = -(-len(sorted_stocks) // page_size)
+        return [format_stock_page(sorted_stocks, page_idx, page_size, total_pages) for page_idx in range(total_pages)]
+        
+    except Exception as e:
+        logger.error(f"Error formatting stock list: {e}")
+        return [f"❌ **Error formatting stock list**\n\n`{str(e)}`"]
+
+def format_stock_page(sorted_stocks: List[Dict], page_idx: int, page_size: int = 20,
+                      total_pages: Optional[int] = None) -> str:
+    """
+    Format a single page of an already alphabetically sorted stock list
+    total_pages is derived from the list length when not given
+    """
+    try:
+        i = page_idx * page_size
+        page_stocks = sorted_stocks[i:i + page_size]
+        
+        stock_lines = []
+        for j, stock in enumerate(page_stocks, i + 1):
+            name = stock.get('name', 'Unknown')
+            serial = stock.get('serial_number', 'N/A')
+            change = stock.get('change', 0)
             
-            page_num = (i // page_size) + 1
-            total_pages = (len(sorted_stocks) + page_size - 1) // page_size
+            change_indicator = ""
+            if change > 0:
+                change_indicator = " ⬆️"
+            elif change < 0:
+                change_indicator = " ⬇️"
             
-            page_content = f"""
+            stock_lines.append(f"`{j:2d}.` **{name}** - Serial: `{serial}`{change_indicator}")
+        
+        stock_list = '\n'.join(stock_lines)
+        page_num = page_idx + 1
+        if total_pages is None:
+            total_pages = -(-len(sorted_stocks) // page_size)
+        
+        page_content = f"""
 📋 **Available Stocks** (Page {page_num}/{total_pages})
 
-{chr(10).join(stock_lines)}
+{stock_list}
 
 📊 **Total Stocks:** {len(sorted_stocks)}
-⏰ **Last Updated:** {datetime.now().strftime('%H:%M:%S')}
-            """.strip()
-            
-            pages.append(page_content)
+⏰ **Last Updated:** {_now_hms()}
+        """.strip()
         
-        return pages
+        return page_content
         
     except Exception as e:
-        logger.error(f"Error formatting stock list: {e}")
-        return [f"❌ **Error formatting stock list**\n\n`{str(e)}`"]
+        logger.error(f"Error formatting stock page: {e}")
+        return f"❌ **Error formatting stock list**\n\n`{str(e)}`"
 
 def validate_stock_name(name: str) -> bool:
     """
@@ -219,19 +292,15 @@ def validate_stock_name(name: str) -> bool:
     if len(name) < 2 or len(name) > 20:
         return False
     
+    upper_name = name.upper()
+    
     # Check for invalid characters
-    if not re.match(r'^[A-Z0-9\-_&]+$', name.upper()):
+    if not _VALID_NAME_RE.match(upper_name):
         return False
     
-    # Check for common invalid patterns
-    invalid_patterns = [
-        r'^\d+$',  # Only numbers
-        r'^[^A-Z]+$',  # No letters
-    ]
-    
-    for pattern in invalid_patterns:
-        if re.match(pattern, name.upper()):
-            return False
+    # Must contain at least one letter (this also rules out all-digit names)
+    if not any(char.isalpha() for char in upper_name):
+        return False
     
     return True
 
@@ -240,10 +309,10 @@ def sanitize_filename(filename: str) -> str:
     Sanitize filename for safe file system storage
     """
     # Remove or replace dangerous characters
-    safe_filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
+    safe_filename = _FN_BAD_RE.sub('_', filename)
     
     # Remove control characters
-    safe_filename = ''.join(char for char in safe_filename if ord(char) >= 32)
+    safe_filename = safe_filename.translate(_CTRL_DEL)
     
     # Limit length
     if len(safe_filename) > 200:
@@ -259,6 +328,12 @@ def parse_timestamp(timestamp_str: str) -> Optional[datetime]:
     if not timestamp_str:
         return None
     
+    # Fast path: stored timestamps are ISO format, parsed in C without raising
+    try:
+        return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+    except ValueError:
+        pass
+    
     formats = [
         '%Y-%m-%dT%H:%M:%S.%f',  # ISO format with microseconds
         '%Y-%m-%dT%H:%M:%S',     # ISO format
@@ -274,15 +349,12 @@ def parse_timestamp(timestamp_str: str) -> Optional[datetime]:
         except ValueError:
             continue
     
-    # Try ISO format parsing
-    try:
-        return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-    except:
-        pass
-    
     logger.warning(f"Could not parse timestamp: {timestamp_str}")
     return None
 
+# (suffix, power-of-two shift) for format_file_size, indexed by bit length // 10
+_SIZE_UNITS = (('B', 0), ('KB', 10), ('MB', 20), ('GB', 30))
+
 def format_file_size(size_bytes: int) -> str:
     """
     Format file size in human-readable format
@@ -290,12 +362,10 @@ def format_file_size(size_bytes: int) -> str:
     try:
         if size_bytes < 1024:
             return f"{size_bytes} B"
-        elif size_bytes < 1024**2:
-            return f"{size_bytes/1024:.1f} KB"
-        elif size_bytes < 1024**3:
-            return f"{size_bytes/(1024**2):.1f} MB"
-        else:
-            return f"{size_bytes/(1024**3):.1f} GB"
+        
+        # Unit from the bit length: every 10 bits is a factor of 1024 (capped at GB)
+        suffix, shift = _SIZE_UNITS[min((int(size_bytes).bit_length() - 1) // 10, 3)]
+        return f"{size_bytes / (1 << shift):.1f} {suffix}"
     except:
         return "Unknown size"
 
@@ -303,10 +373,14 @@ def truncate_text(text: str, max_length: int = 100) -> str:
     """
     Truncate text to specified length with ellipsis
     """
+    # Short text is returned as-is, without a copy
     if not text or len(text) <= max_length:
         return text
     
-    return text[:max_length-3] + "..."
+    return f"{text[:max_length-3]}..."
+
+# Characters that need escaping in Telegram markdown, mapped to their escaped form
+_MARKDOWN_ESCAPES = str.maketrans({char: f'\\{char}' for char in '_*[]()~`>#+-=|{}.!'})
 
 def escape_markdown(text: str) -> str:
     """
@@ -315,11 +389,5 @@ def escape_markdown(text: str) -> str:
     if not text:
         return ""
     
-    # Characters that need escaping in Telegram markdown
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    
-    escaped = str(text)
-    for char in special_chars:
-        escaped = escaped.replace(char, f'\\{char}')
-    
-    return escaped
+    # Single pass over the text with the precomputed table
+    return str(text).translate(_MARKDOWN_ESCAPES)